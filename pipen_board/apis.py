@@ -4,16 +4,26 @@ import base64
 import json
 import re
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 from panpath import PanPath, CloudPath
-from quart import abort, request, redirect, send_file
+from quart import abort, current_app, request, redirect, send_file
 from slugify import slugify
 
 from .version import __version__
-from .defaults import JOB_STATUS, SECTION_PIPELINE_OPTIONS, logger
+from .defaults import (
+    JOB_STATUS,
+    PROTOCOL_VERSION,
+    SECTION_PIPELINE_OPTIONS,
+    logger,
+)
 from .data_manager import data_manager
+from .fetcher import fetcher
+from .history_index import get_history_index, known_bases
+from .config_store import apply_patch, collect_bases, load_config, save_config
+from .option_templates import compact_config, strip_templates
 
 
 if TYPE_CHECKING:
@@ -21,6 +31,37 @@ if TYPE_CHECKING:
 
 
 # Helper functions
+async def _query_args() -> Mapping[str, Any]:
+    """The arguments of a read-only query
+
+    From the query string of a GET request, which can be revalidated by the
+    ETag, or the JSON body of a POST request, as sent by the older frontends.
+    """
+    if request.method == "GET":
+        return request.args
+    return await request.get_json()
+
+
+def _is_legacy(req: Mapping[str, Any]) -> bool:
+    """Whether the request is from a frontend before the protocol was
+    versioned, which expects the data in the older format"""
+    return int(req.get("protocol") or 1) < PROTOCOL_VERSION
+
+
+async def _collect_bases(schema_dir: PanPath) -> None:
+    """Remove the bases of the saved configurations no longer used"""
+    try:
+        removed = await collect_bases(schema_dir, await known_bases(schema_dir))
+    except Exception as exc:  # pragma: no cover
+        logger.warning("Failed to remove the unused bases: %s", exc)
+    else:
+        if removed:
+            logger.info(
+                "[bold][yellow]API[/yellow][/bold] Removed %s unused bases",
+                removed,
+            )
+
+
 async def _get_children(parent: PanPath, idx: int = 0) -> Tuple[Mapping[str, Any], int]:
     """Get the children of a parent path"""
     out = []
@@ -64,38 +105,51 @@ async def index():
 
 
 async def history():
+    """List the saved configurations, from the history index
+
+    The query arguments `workdir` and `name` filter the histories by the
+    workdir and by the name (case-insensitive substring), `page` (1-based)
+    and `per_page` paginate them, and `refresh=1` rebuilds the index by
+    scanning the schema directory.
+    """
     logger.info("[bold][yellow]API[/yellow][/bold] Getting histories")
     args = request.cli_args
     out = {}
     out["pipeline"] = args.pipeline
-    out["histories"] = []
     curr_workdir = args.workdir
 
-    async for histfile in PanPath(args.schema_dir).a_glob(
-        f"{slugify(args.pipeline)}.*.*.json"
-    ):
-        ctime = (await histfile.a_stat()).st_ctime or 0
-        mtime = (await histfile.a_stat()).st_mtime or 0
-        if isinstance(ctime, (int, float)):
-            ctime = datetime.fromtimestamp(ctime)
-        if isinstance(mtime, (int, float)):
-            mtime = datetime.fromtimestamp(mtime)
-
-        name = histfile.stem.split(".")[-2]
-        workdir = base64.b64decode(histfile.stem.split(".")[-1] + "==").decode()
-
-        out["histories"].append(
-            {
-                "name": name,
-                "configfile": histfile.name,
-                "workdir": workdir,
-                "is_current": workdir == str(curr_workdir),
-                # 2023-01-01_00-00-00 to
-                # 2023-01-01 00:00:00
-                "ctime": ctime.strftime("%Y-%m-%d %H:%M:%S"),
-                "mtime": mtime.strftime("%Y-%m-%d %H:%M:%S"),
-            }
-        )
+    entries = await get_history_index(args.schema_dir, args.pipeline).query(
+        workdir=request.args.get("workdir"),
+        name=request.args.get("name"),
+        refresh=request.args.get("refresh") in ("1", "true"),
+    )
+    out["total"] = len(entries)
+    per_page = request.args.get("per_page")
+    if per_page:
+        per_page = max(1, int(per_page))
+        page = max(1, int(request.args.get("page", 1)))
+        entries = entries[(page - 1) * per_page:page * per_page]
+        out["page"] = page
+        out["per_page"] = per_page
+
+    out["histories"] = [
+        {
+            "name": entry["name"],
+            "configfile": entry["configfile"],
+            "workdir": entry["workdir"],
+            "is_current": entry["workdir"] == str(curr_workdir),
+            "size": entry["size"],
+            # 2023-01-01_00-00-00 to
+            # 2023-01-01 00:00:00
+            "ctime": datetime.fromtimestamp(entry["ctime"]).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+            "mtime": datetime.fromtimestamp(entry["mtime"]).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+        }
+        for entry in entries
+    ]
 
     return out
 
@@ -106,11 +160,54 @@ async def version():
 
 
 async def pipeline_data():
+    """Get the pipeline data
+
+    With GET, `skeleton` is "1" for true, and `preset` is a JSON string.
+    The frontend POSTs the large presets.
+
+    The older frontends, not sending `protocol`, get the config data and
+    the run data in the older format.
+    """
     logger.info("[bold][yellow]API[/yellow][/bold] Getting pipeline data")
-    req = await request.get_json()
+    req = await _query_args()
     configfile = req.get("configfile")
     preset = req.get("preset")
-    return await data_manager.get_data(request.cli_args, configfile, preset)
+    skeleton = req.get("skeleton", False)
+    if request.method == "GET":
+        preset = preset and json.loads(preset)
+        skeleton = skeleton in ("1", "true")
+    return await data_manager.get_data(
+        request.cli_args,
+        configfile,
+        preset,
+        skeleton=skeleton,
+        legacy=_is_legacy(req),
+    )
+
+
+async def pipeline_proc():
+    """Get the config data of a process, for the pipeline loaded in skeleton
+
+    The configfile and the preset that the pipeline was loaded with are
+    passed, so that the process is resolved from the same config data.
+    """
+    req = await request.get_json()
+    proc = req["proc"]
+    procgroup = req.get("procgroup")
+    logger.info(
+        "[bold][yellow]API[/yellow][/bold] Getting process data: %s",
+        proc,
+    )
+    data = await data_manager.get_proc_config(
+        request.cli_args,
+        proc,
+        procgroup,
+        configfile=req.get("configfile"),
+        preset=req.get("preset"),
+    )
+    if data is None:
+        return abort(404)
+    return data
 
 
 async def reports(report_path):
@@ -150,13 +247,16 @@ async def report_building_log():
 
 async def history_get():
     args = request.cli_args
-    configfile = (await request.get_json())["configfile"]
+    req = await _query_args()
+    configfile = req["configfile"]
     logger.info(
         "[bold][yellow]API[/yellow][/bold] Fetching history: %s",
         configfile,
     )
-    configfile = PanPath(args.schema_dir).joinpath(configfile)
-    return {"ok": True, "data": await configfile.a_read_text()}
+    jdata, _ = await load_config(PanPath(args.schema_dir).joinpath(configfile))
+    if _is_legacy(req):
+        return {"ok": True, "data": json.dumps(strip_templates(jdata), indent=4)}
+    return {"ok": True, "data": json.dumps(compact_config(jdata))}
 
 
 async def history_del():
@@ -167,6 +267,9 @@ async def history_del():
         configfile,
     )
     await PanPath(args.schema_dir).joinpath(configfile).a_unlink()
+    await get_history_index(args.schema_dir, args.pipeline).remove(configfile)
+    # Not to hold the response
+    current_app.add_background_task(_collect_bases, PanPath(args.schema_dir))
     return {"ok": True}
 
 
@@ -185,7 +288,7 @@ async def history_saveas():
         newname,
     )
     try:
-        jdata = json.loads(await schema_dir.joinpath(configfile).a_read_text())
+        jdata, base = await load_config(schema_dir.joinpath(configfile))
         jdata[SECTION_PIPELINE_OPTIONS]["name"]["value"] = newname
 
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -212,7 +315,18 @@ async def history_saveas():
                     "placeholder"
                 ] = f"{newname}.config.toml"
 
-        await newconfigfile.a_write_text(json.dumps(jdata, indent=4))
+        # Share the base with the original one
+        size, base = await save_config(
+            newconfigfile,
+            jdata,
+            base=base,
+            pristine=lambda: data_manager.get_pristine_config(args),
+        )
+        await get_history_index(args.schema_dir, args.pipeline).update(
+            newconfigfile.name,
+            size,
+            base,
+        )
         out["configfile"] = newconfigfile.name
 
     except Exception as exc:
@@ -227,8 +341,14 @@ async def history_download():
         "[bold][yellow]API[/yellow][/bold] Downloading schema: %s",
         configfile,
     )
-    schema_dir = request.cli_args.schema_dir
-    return await send_file(schema_dir.joinpath(configfile), as_attachment=True)
+    schema_dir = PanPath(request.cli_args.schema_dir)
+    jdata, _ = await load_config(schema_dir.joinpath(configfile))
+    return await send_file(
+        BytesIO(json.dumps(jdata, indent=4).encode()),
+        mimetype="application/json",
+        as_attachment=True,
+        attachment_filename=configfile,
+    )
 
 
 # async def history_upload():
@@ -279,10 +399,8 @@ async def history_fromurl():
             url,
         )
         try:
-            import urllib.request
-
-            with urllib.request.urlopen(url) as response:
-                return {"ok": True, "content": response.read().decode()}
+            # Always revalidate, the file may be updated just now
+            return {"ok": True, "content": await fetcher.fetch_text(url, max_age=0)}
         except Exception:
             try:
                 path = PanPath(url)
@@ -333,7 +451,6 @@ async def config_save():
                     "placeholder"
                 ] = f"{name}.config.toml"
 
-        configdata = json.dumps(jdata, indent=4)
         configfile = schema_dir.joinpath(f"{slugify(args.pipeline)}.{name}.{enc}.json")
         if await configfile.a_exists():
             return {"ok": False, "error": "File already exists."}
@@ -351,13 +468,63 @@ async def config_save():
         logger.info(f"[bold][yellow]API[/yellow][/bold] Saving config to: {configfile}")
 
     out["configfile"] = configfile.name
-    await configfile.a_write_text(configdata)
+    # Saved as a patch against the base of the file, or the config data
+    # generated from the pipeline for a new file
+    size, base = await save_config(
+        configfile,
+        jdata,
+        pristine=lambda: data_manager.get_pristine_config(args),
+    )
+    await get_history_index(args.schema_dir, args.pipeline).update(
+        configfile.name,
+        size,
+        base,
+    )
     return out
 
 
-async def job_get_tree():
+async def config_save_partial():
+    """Save the changes of a saved configuration
+
+    The frontend sends only the changed fields, as `{"set": [[path, value]],
+    "del": [path]}`, which are applied to the saved configuration.
+    """
     args = request.cli_args
     data = await request.get_json()
+    configfile = PanPath(args.schema_dir).joinpath(data["configfile"])
+    changes = data["changes"]
+    logger.info(
+        "[bold][yellow]API[/yellow][/bold] Saving %s changes to: %s",
+        len(changes.get("set", ())) + len(changes.get("del", ())),
+        configfile,
+    )
+    try:
+        jdata, base = await load_config(configfile)
+    except FileNotFoundError:
+        return {"ok": False, "error": "File not found."}
+
+    jdata = apply_patch(jdata, changes)
+    size, base = await save_config(
+        configfile,
+        jdata,
+        base=base,
+        pristine=lambda: data_manager.get_pristine_config(args),
+    )
+    await get_history_index(args.schema_dir, args.pipeline).update(
+        configfile.name,
+        size,
+        base,
+    )
+    return {
+        "name": jdata[SECTION_PIPELINE_OPTIONS]["name"]["value"],
+        "mtime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "configfile": configfile.name,
+    }
+
+
+async def job_get_tree():
+    args = request.cli_args
+    data = await _query_args()
     logger.info(
         "[bold][yellow]API[/yellow][/bold] Fetching tree for: "
         f"{data['proc']}/{data['job']}"
@@ -461,42 +628,124 @@ async def job_get_file_metadata():
     }
 
 
+async def run_log():
+    """Get a range of the log of the current/last run
+
+    The query argument `log` is the id of the log that the offset is in.
+    """
+    offset = int(request.args.get("offset", 0))
+    size = request.args.get("size")
+    size = None if size is None else int(size)
+    log_id = request.args.get("log")
+    logger.info(
+        "[bold][yellow]API[/yellow][/bold] Fetching run log: "
+        "log=%s, offset=%s, size=%s",
+        log_id,
+        offset,
+        size,
+    )
+    return await data_manager.get_log(offset, size, log_id)
+
+
+async def run_summary():
+    """Get the progress of the current/last run, without the job statuses"""
+    return data_manager.get_summary()
+
+
 async def pipeline_stop():
     return await data_manager.stop_pipeline()
 
 
-async def ws_web(data, clients):
+async def ws_web(data, clients, conn):
     logger.info(f"WS/WEB Received: {data}")
+    if data.get("type") == "resync":
+        # The frontend missed some patches, send the whole run data
+        await data_manager.send_run_snapshot(
+            clients["web"],
+            clients["web"].get(conn),
+        )
 
 
-async def ws_pipeline(data, clients):
+async def ws_pipeline(data, clients, conn):
     # logdata = str(data)
     # if len(logdata) > 100:
     #     logdata = logdata[:100] + "..."
 
     # logger.info(f"WS/PIPELINE Received: {logdata}")
     type = data.get("type")
-    if type and type.startswith("on_") and callable(getattr(data_manager, type, None)):
-        await getattr(data_manager, type)(data["data"], clients.get("web"))
+    if type == "resume":
+        # The plugin reconnected, let it know the last frame we received
+        await conn.send(
+            json.dumps({"type": "resume", "seq": data_manager.pipeline_seq})
+        )
+    elif type == "batch":
+        # Events sent in batches by the plugin, numbered by "seq"
+        seq = data.get("seq")
+        if seq is not None:
+            if seq <= data_manager.pipeline_seq:
+                # Replayed after reconnecting, already received
+                return
+            if seq > data_manager.pipeline_seq + 1:
+                logger.warning(
+                    "WS/PIPELINE Events lost (%s-%s).",
+                    data_manager.pipeline_seq + 1,
+                    seq - 1,
+                )
+            data_manager.pipeline_seq = seq
+        for event in data["events"]:
+            await ws_pipeline(event, clients, conn)
+    elif (
+        type and type.startswith("on_") and callable(getattr(data_manager, type, None))
+    ):
+        await getattr(data_manager, type)(data["data"])
 
 
-async def ws_web_conn(clients):
-    logger.info("WS/WEB Client 'web' connected.")
+async def ws_web_conn(data, clients, conn):
+    # Each browser tab/viewer is a subscriber of the run
+    # The older frontends get the whole run data every time
+    subscriber = clients["web"].add(conn, legacy=_is_legacy(data))
+    logger.info(
+        "WS/WEB Client 'web' connected (%s viewers).",
+        len(clients["web"]),
+    )
     # send the current run data, to let UI know the current status
-    await data_manager.send_run_data(clients["web"], True)
+    await data_manager.send_run_snapshot(clients["web"], subscriber)
+
+
+async def ws_watch(data, clients, conn):
+    # Only notified, nothing expected from the pages watching the pipeline
+    pass
 
 
-async def ws_pipeline_conn(clients):
+async def ws_watch_conn(data, clients, conn):
+    # Not a viewer of the run, only notified when the pipeline changes
+    clients["watch"].add(conn)
+
+
+async def ws_watch_disconn(clients, conn):
+    clients["watch"].remove(conn)
+
+
+async def ws_pipeline_conn(data, clients, conn):
+    clients["pipeline"] = conn
     logger.info("WS/PIPELINE Client 'pipeline' connected.")
 
 
-async def ws_web_disconn(clients):
-    logger.info("WS/WEB Client 'web' disconnected.")
+async def ws_web_disconn(clients, conn):
+    clients["web"].remove(conn)
+    logger.info(
+        "WS/WEB Client 'web' disconnected (%s viewers).",
+        len(clients["web"]),
+    )
 
 
-async def ws_pipeline_disconn(clients):
+async def ws_pipeline_disconn(clients, conn):
+    # The plugin may reconnect and resume if the connection drops
+    # in the middle of a run, the run is marked as finished when the
+    # pipeline completes or its process exits.
     logger.info("WS/PIPELINE Client 'pipeline' disconnected.")
-    data_manager.running = False
+    if clients.get("pipeline") is conn:
+        clients.pop("pipeline")
 
 
 GETS = {
@@ -504,11 +753,18 @@ GETS = {
     "/api/history": history,
     "/api/version": version,
     "/api/report_building_log": report_building_log,
+    "/api/run/log": run_log,
+    "/api/run/summary": run_summary,
+    # The read-only queries, also POST for the older frontends
+    "/api/pipeline": pipeline_data,
+    "/api/history/get": history_get,
+    "/api/job/get_tree": job_get_tree,
     "/reports/<path:report_path>": reports,
 }
 
 POSTS = {
     "/api/pipeline": pipeline_data,
+    "/api/pipeline/proc": pipeline_proc,
     "/api/history/get": history_get,
     "/api/history/del": history_del,
     "/api/history/saveas": history_saveas,
@@ -516,6 +772,7 @@ POSTS = {
     # "/api/history/upload": history_upload,
     "/api/history/fromurl": history_fromurl,
     "/api/config/save": config_save,
+    "/api/config/save_partial": config_save_partial,
     "/api/job/get_tree": job_get_tree,
     "/api/job/get_file": job_get_file,
     "/api/job/get_file_metadata": job_get_file_metadata,
@@ -529,4 +786,7 @@ WS = {
     "pipeline/conn": ws_pipeline_conn,
     "web/disconn": ws_web_disconn,
     "pipeline/disconn": ws_pipeline_disconn,
+    "watch": ws_watch,
+    "watch/conn": ws_watch_conn,
+    "watch/disconn": ws_watch_disconn,
 }
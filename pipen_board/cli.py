@@ -72,6 +72,39 @@ class PipenCliBoardPlugin(CLIPlugin):
                 "configurations. Page cache is also disabled in this mode."
             ),
         )
+        subparser.add_argument(
+            "--push-interval",
+            dest="push_interval",
+            type=float,
+            default=1.0,
+            help=(
+                "The minimum interval in seconds between two pushes of the "
+                "running data to the web clients. Changes in between are "
+                "coalesced and pushed together."
+            ),
+        )
+        subparser.add_argument(
+            "--loader-workers",
+            dest="loader_workers",
+            type=int,
+            default=1,
+            help=(
+                "The number of idle processes kept warm, with pipen imported, "
+                "to load the pipeline."
+            ),
+        )
+        subparser.add_argument(
+            "--loader-max-loads",
+            dest="loader_max_loads",
+            type=int,
+            default=1,
+            help=(
+                "The max number of loads of the pipeline by a loader process "
+                "before it is recycled. A process is also recycled when any "
+                "module it loaded changes. The default of 1 ensures a clean "
+                "environment for each load."
+            ),
+        )
         subparser.add_argument(
             "-w",
             "--workdir",
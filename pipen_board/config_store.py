@@ -0,0 +1,279 @@
+"""Provides the storage of the saved configurations (histories)
+
+The config data is large, with the descriptions and the argspecs of all the
+processes, while the users usually change only a few values. So the config
+data is saved once as a base, shared by content, and each saved
+configuration keeps only a patch against its base, compressed:
+
+    {"format": "pipen-board-patch/1", "base": "<sha256>", "patch": {
+        "set": [[["PROCESSES", "P1", "value", "envs", "value", "a"], 1]],
+        "del": [["PROCESSES", "P2", "value", "envs", "value", "b"]]
+    }}
+
+The base is the config data generated from the pipeline, so that the
+patches only keep the changes of the users. The bases are saved (compacted
+by the option templates, and compressed) in the `.bases` directory of the
+schema directory, and removed by `collect_bases` when no saved configuration
+refers to them. The configurations saved as plain JSON by the previous
+versions are still loaded, and converted when saved again.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import time
+from copy import deepcopy
+from hashlib import sha256
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Sequence, Tuple
+
+from panpath import PanPath
+
+from .defaults import timestamp
+from .option_templates import compact_config, expand_config
+
+PATCH_FORMAT = "pipen-board-patch/1"
+BASES_DIR = ".bases"
+GZIP_MAGIC = b"\x1f\x8b"
+# The bases younger than this are never collected, as the configurations
+# referring to them may be being saved
+BASE_GRACE_PERIOD = 300
+
+# The bases loaded, expanded, by their files
+_bases: Dict[str, Mapping[str, Any]] = {}
+# When the bases were last taken to save the configurations, by their files
+_bases_used: Dict[str, float] = {}
+
+
+def diff_config(
+    base: Any,
+    data: Any,
+    path: Tuple[str, ...] = (),
+    patch: Mapping[str, List] | None = None,
+) -> Mapping[str, List]:
+    """Get the patch that turns the base into the data
+
+    The dicts are compared recursively, any other values are replaced
+    as a whole.
+
+    Args:
+        base: The base config data
+        data: The new config data
+        path: The path of the values compared, used in the recursion
+        patch: The patch to add to, used in the recursion
+
+    Returns:
+        The patch, with the values to set as `[path, value]` in `set`, and
+        the paths of the keys to delete in `del`
+    """
+    if patch is None:
+        patch = {"set": [], "del": []}
+
+    if isinstance(base, dict) and isinstance(data, dict):
+        for key, val in data.items():
+            if key not in base:
+                patch["set"].append([[*path, key], val])
+            else:
+                diff_config(base[key], val, (*path, key), patch)
+        for key in base:
+            if key not in data:
+                patch["del"].append([*path, key])
+    elif base != data:
+        patch["set"].append([list(path), data])
+
+    return patch
+
+
+def apply_patch(
+    data: Mapping[str, Any],
+    patch: Mapping[str, Sequence],
+) -> Mapping[str, Any]:
+    """Apply a patch to the config data, in place
+
+    Args:
+        data: The config data
+        patch: The patch from `diff_config`, or the changes sent by the
+            frontend in the same structure
+
+    Returns:
+        The patched config data
+    """
+    for path in patch.get("del", ()):
+        parent = data
+        for key in path[:-1]:
+            parent = parent.get(key) if isinstance(parent, dict) else None
+        if isinstance(parent, dict):
+            parent.pop(path[-1], None)
+
+    for path, value in patch.get("set", ()):
+        if not path:
+            return deepcopy(value)
+        parent = data
+        for key in path[:-1]:
+            if not isinstance(parent.get(key), dict):
+                parent[key] = {}
+            parent = parent[key]
+        parent[path[-1]] = deepcopy(value)
+
+    return data
+
+
+def _loads(content: bytes) -> Any:
+    """Load the content of a saved file, compressed or not"""
+    if content.startswith(GZIP_MAGIC):
+        content = gzip.decompress(content)
+    return json.loads(content)
+
+
+def _dumps(data: Any) -> bytes:
+    """Dump the data to be saved, compressed"""
+    return gzip.compress(
+        json.dumps(data, separators=(",", ":"), default=str).encode(),
+        mtime=0,
+    )
+
+
+def _base_file(schema_dir: PanPath, digest: str) -> PanPath:
+    """The file of a base"""
+    return schema_dir.joinpath(BASES_DIR, f"{digest}.json.gz")
+
+
+async def _load_base(schema_dir: PanPath, digest: str) -> Mapping[str, Any]:
+    """Load a base, expanded, from memory or the bases directory"""
+    basefile = _base_file(schema_dir, digest)
+    if str(basefile) not in _bases:
+        _bases[str(basefile)] = expand_config(_loads(await basefile.a_read_bytes()))
+    return _bases[str(basefile)]
+
+
+async def _save_base(schema_dir: PanPath, data: Mapping[str, Any]) -> str:
+    """Save the config data as a base, if not saved yet
+
+    Returns:
+        The digest of the base
+    """
+    content = _dumps(compact_config(data))
+    digest = sha256(content).hexdigest()
+    basefile = _base_file(schema_dir, digest)
+    _bases_used[str(basefile)] = time.time()
+    if str(basefile) in _bases:
+        return digest
+
+    if not await basefile.a_exists():
+        await basefile.parent.a_mkdir(parents=True, exist_ok=True)
+        await basefile.a_write_bytes(content)
+    _bases[str(basefile)] = deepcopy(data)
+    return digest
+
+
+async def load_config(path: PanPath) -> Tuple[Mapping[str, Any], str | None]:
+    """Load a saved configuration
+
+    Args:
+        path: The path to the saved file
+
+    Returns:
+        The config data, expanded, and the digest of its base, None if it
+        is saved as plain JSON
+    """
+    doc = _loads(await path.a_read_bytes())
+    if not isinstance(doc, dict) or doc.get("format") != PATCH_FORMAT:
+        return expand_config(doc), None
+
+    base = await _load_base(path.parent, doc["base"])
+    return apply_patch(deepcopy(base), doc["patch"]), doc["base"]
+
+
+async def save_config(
+    path: PanPath,
+    data: Mapping[str, Any],
+    base: str | None = None,
+    pristine: Callable[[], Awaitable[Mapping[str, Any] | None]] | None = None,
+) -> Tuple[int, str]:
+    """Save a configuration as a patch against its base
+
+    Args:
+        path: The path to the saved file
+        data: The config data, expanded
+        base: The digest of the base to use. If not given, the base of the
+            existing file is used, or the pristine config data is saved as
+            a new base.
+        pristine: Called to get the config data generated from the pipeline,
+            only when a new base is needed, as it may load the pipeline.
+            If not given or returning None, the data itself is used.
+
+    Returns:
+        The number of bytes written and the digest of the base
+    """
+    if base is None and await path.a_exists():
+        try:
+            doc = _loads(await path.a_read_bytes())
+        except ValueError:
+            doc = None
+        if isinstance(doc, dict) and doc.get("format") == PATCH_FORMAT:
+            base = doc["base"]
+
+    if base is None:
+        pristine_data = pristine and await pristine()
+        base = await _save_base(path.parent, pristine_data or data)
+
+    patch = diff_config(await _load_base(path.parent, base), data)
+    content = _dumps({"format": PATCH_FORMAT, "base": base, "patch": patch})
+    await path.a_write_bytes(content)
+    return len(content), base
+
+
+async def collect_bases(
+    schema_dir: PanPath,
+    known: Mapping[str, str | None],
+) -> int:
+    """Remove the bases that no saved configuration refers to
+
+    The bases are shared by the configurations of all the pipelines in the
+    schema directory, so all the saved configurations are checked, by their
+    bases recorded in the history indexes, only the ones not recorded are
+    read.
+
+    Args:
+        schema_dir: The schema directory
+        known: The digests of the bases of the saved configurations (None
+            for the plain ones), by the names of the files
+
+    Returns:
+        The number of the bases removed
+    """
+    bases_dir = schema_dir.joinpath(BASES_DIR)
+    if not await bases_dir.a_is_dir():
+        return 0
+
+    used = set()
+    async for path in schema_dir.a_glob("*.json"):
+        if path.name.startswith("."):
+            continue
+        if path.name in known:
+            used.add(known[path.name])
+            continue
+        try:
+            doc = _loads(await path.a_read_bytes())
+        except (OSError, ValueError):
+            continue
+        if isinstance(doc, dict) and doc.get("format") == PATCH_FORMAT:
+            used.add(doc["base"])
+
+    removed = 0
+    now = time.time()
+    async for basefile in bases_dir.a_glob("*.json.gz"):
+        if basefile.name[: -len(".json.gz")] in used:
+            continue
+        if now - _bases_used.get(str(basefile), 0) < BASE_GRACE_PERIOD:
+            continue
+        try:
+            mtime = timestamp((await basefile.a_stat()).st_mtime)
+            if now - mtime < BASE_GRACE_PERIOD:
+                continue
+            await basefile.a_unlink()
+        except OSError:
+            continue
+        _bases.pop(str(basefile), None)
+        removed += 1
+    return removed
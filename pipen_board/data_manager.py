@@ -7,18 +7,23 @@ import json
 import os
 import re
 import signal
+import sys
+import threading
 import textwrap
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
-from multiprocessing import get_context
+from functools import lru_cache
+from hashlib import sha256
+from multiprocessing import get_all_start_methods, get_context
 from pathlib import Path
 from tempfile import gettempdir
-from typing import TYPE_CHECKING, Any, Mapping, Type
+from typing import TYPE_CHECKING, Any, List, Mapping, Sequence, Type
 from urllib.parse import urlparse
 
 from panpath import PanPath, CloudPath
 from simpleconf import Config
-from slugify import slugify
 from liquid import Liquid
 from pipen import Proc
 from pipen.utils import get_marked, load_pipeline, update_dict
@@ -32,12 +37,29 @@ from .defaults import (
     SECTION_DIAGRAM,
     SECTION_REPORTS,
     SECTION_LOG,
+    SECTION_LOG_START,
+    SECTION_LOG_ID,
+    SECTION_SUMMARY,
+    SECTION_TEMPLATES,
     PIPELINE_OPTIONS,
+    JOB_STATUS_CODES,
+    json_default,
     logger,
 )
+from .version import __version__
+from .run_log import LogFile, RunLog, lstrip_partial_char, strip_partial_char
+from .job_status import JobStatuses
+from .loader_pool import LoaderPool, file_signature
+from .fetcher import fetcher
+from .watcher import FileWatcher
+from .job_index import JobIndex
+from .option_templates import compact_config, compact_proc, strip_templates
+from .config_store import load_config
 
 if TYPE_CHECKING:
     from argparse import Namespace
+    from pipen import Pipen
+    from .subscribers import Subscriber, Subscribers
 
 DEFAULT_RUN_DATA = {
     "FINISHED": False,
@@ -47,16 +69,48 @@ DEFAULT_RUN_DATA = {
     SECTION_DIAGRAM: None,
     # "reports": <reportdir>
     SECTION_REPORTS: None,
-    # "PROCESSES": { proc: { status, jobs: [status] } }
+    # "PROCESSES": { proc: { status, jobs: JobStatuses } }
     SECTION_PROCESSES: {},
     # "PROCGROUPS": {
-    #     procgroup: { proc: { status, jobs: [status] } }
+    #     procgroup: { proc: { status, jobs: JobStatuses } }
     # }
     SECTION_PROCGROUPS: {},
+    # "SUMMARY": {
+    #     pipeline: { procs: { status: n }, jobs: { status: n } },
+    #     procgroups: { procgroup: { procs: {...}, jobs: {...} } },
+    # }
+    SECTION_SUMMARY: None,
 }
 
 # proc status: init, running, succeeded, failed
 # job status: init, queued, submitted, running, killed, succeeded, failed
+# (see JOB_STATUS_CODES in defaults.py)
+
+
+def _new_counter() -> Mapping[str, Mapping[str, int]]:
+    """A counter of the processes and jobs in each status"""
+    return {"procs": {}, "jobs": {}}
+
+
+def _move_count(
+    counter: Mapping[str, int],
+    old: str | None,
+    new: str | None,
+    n: int = 1,
+) -> None:
+    """Move n items from the old status to the new one in the counter"""
+    if old is not None:
+        counter[old] = counter.get(old, 0) - n
+        if counter[old] <= 0:
+            del counter[old]
+    if new is not None:
+        counter[new] = counter.get(new, 0) + n
+
+
+@lru_cache(maxsize=None)
+def _annotate(klass: type) -> Mapping[str, Any]:
+    """Annotate a class, memoized as the classes can be shared by processes"""
+    return annotate(klass)
 
 
 def _anno_to_argspec(anno: Mapping[str, Any] | None) -> Mapping[str, Any]:
@@ -177,6 +231,26 @@ def _get_default(argspec: Mapping[str, Any], force_ns: bool = False) -> Any:
     return default
 
 
+# The options of the processes inherited from the pipeline, shared as templates
+PROC_OPTION_TEMPLATES = (
+    "plugin_opts",
+    "scheduler_opts",
+    "forks",
+    "cache",
+    "scheduler",
+    "dirsig",
+    "error_strategy",
+    "num_retries",
+)
+
+
+def _proc_option(key: str) -> Mapping[str, Any]:
+    """Get a copy of the pipeline option for a process, with the default set"""
+    option = deepcopy(PIPELINE_OPTIONS[key])
+    _get_default(option, force_ns=key.endswith("_opts"))
+    return option
+
+
 def _proc_to_argspec(
     proc: Proc | Type[Proc],
     is_start: bool,
@@ -185,9 +259,9 @@ def _proc_to_argspec(
 ) -> Mapping[str, Any]:
     """Convert the proc to the argument spec"""
     if isinstance(proc, Proc):
-        anno = annotate(proc.__class__)
+        anno = _annotate(proc.__class__)
     else:
-        anno = annotate(proc)
+        anno = _annotate(proc)
 
     summary = anno.get("Summary", {"short": "", "long": ""})
     proc_desc = f'# {summary["short"]}\n\n{summary["long"]}'
@@ -220,29 +294,8 @@ def _proc_to_argspec(
     }
     _get_default(argspec["value"]["envs"], force_ns=True)
 
-    argspec["value"]["plugin_opts"] = PIPELINE_OPTIONS["plugin_opts"]
-    _get_default(argspec["value"]["plugin_opts"], force_ns=True)
-
-    argspec["value"]["scheduler_opts"] = PIPELINE_OPTIONS["scheduler_opts"]
-    _get_default(argspec["value"]["scheduler_opts"], force_ns=True)
-
-    argspec["value"]["forks"] = PIPELINE_OPTIONS["forks"]
-    _get_default(argspec["value"]["forks"])
-
-    argspec["value"]["cache"] = PIPELINE_OPTIONS["cache"]
-    _get_default(argspec["value"]["cache"])
-
-    argspec["value"]["scheduler"] = PIPELINE_OPTIONS["scheduler"]
-    _get_default(argspec["value"]["scheduler"])
-
-    argspec["value"]["dirsig"] = PIPELINE_OPTIONS["dirsig"]
-    _get_default(argspec["value"]["dirsig"])
-
-    argspec["value"]["error_strategy"] = PIPELINE_OPTIONS["error_strategy"]
-    _get_default(argspec["value"]["error_strategy"])
-
-    argspec["value"]["num_retries"] = PIPELINE_OPTIONS["num_retries"]
-    _get_default(argspec["value"]["num_retries"])
+    for key in PROC_OPTION_TEMPLATES:
+        argspec["value"][key] = _proc_option(key)
 
     argspec["value"]["lang"] = {
         "desc": "The interpreter to run the script",
@@ -256,9 +309,77 @@ def _proc_to_argspec(
     return argspec
 
 
+# Where the parsed additional config files are cached
+ADDITIONAL_CACHE_DIR = Path(gettempdir()) / "pipen-cli-config-additional-configs"
+# The cache dir is trimmed to this size in bytes, the oldest files go first
+ADDITIONAL_CACHE_MAX_SIZE = 64 * 1024 * 1024
+# The files in the cache dir older than this in seconds are removed
+ADDITIONAL_CACHE_MAX_AGE = 7 * 24 * 3600
+
+
+def _evict_cache(cache_dir: Path, max_size: int, max_age: float) -> None:
+    """Remove the outdated files in the cache dir, and the oldest ones
+    if the total size is still over the limit
+    """
+    now = time.time()
+    files = []
+    try:
+        entries = list(os.scandir(cache_dir))
+    except OSError:
+        return
+
+    for entry in entries:
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        if not entry.is_file():
+            continue
+        if now - st.st_mtime > max_age:
+            Path(entry.path).unlink(missing_ok=True)
+        else:
+            files.append((st.st_mtime, st.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        Path(path).unlink(missing_ok=True)
+        total -= size
+
+
+def _additional_url(additional: str) -> str | None:
+    """The url to fetch a remote additional config file, None if not remote"""
+    if additional.startswith("gh://"):
+        # To avoid the first part being parsed as hostname
+        additional = f"gh:{additional[5:]}"
+
+    parsed = urlparse(additional)
+    if parsed.scheme not in ("http", "https", "ftp", "ftps", "gh"):
+        return None
+
+    if parsed.scheme == "gh":
+        try:
+            user, repo, file_path = parsed.path.split("/", 2)
+        except ValueError:
+            raise ValueError(f"Invalid gh:// URL: {additional}")
+        branch = "master"
+        if "@" in file_path:
+            file_path, branch = file_path.split("@")
+        parsed = urlparse(
+            f"https://raw.githubusercontent.com/{user}/{repo}/{branch}/{file_path}"
+        )
+    return parsed.geturl()
+
+
 async def _load_additional(additional: str, **kwargs) -> Mapping[str, Any]:
     """Load additional config files
 
+    The parsed results are cached on disk by the content of the file and the
+    kwargs, so that the template is not rendered or parsed again unless any
+    of them changes. There is no cache in memory, as this runs in the loader
+    workers, which are replaced after a number of loads.
+
     Args:
         additional: The additional config file to load
         kwargs: Key-value pairs to render the additional config file,
@@ -267,69 +388,106 @@ async def _load_additional(additional: str, **kwargs) -> Mapping[str, Any]:
     if not additional:
         return {}
 
-    if additional.startswith("gh://"):
-        # To avoid the first part being parsed as hostname
-        additional = f"gh:{additional[5:]}"
-
-    parsed = urlparse(additional)
-    cache_dir = PanPath(gettempdir()) / "pipen-cli-config-additional-configs"
+    cache_dir = PanPath(ADDITIONAL_CACHE_DIR)
     await cache_dir.a_mkdir(parents=True, exist_ok=True)
-    if parsed.scheme in ("http", "https", "ftp", "ftps", "gh"):
-        from hashlib import sha256
-        from urllib.error import URLError
-        from urllib.request import urlretrieve
+    url = _additional_url(additional)
+    if url:
+        try:
+            additional = await fetcher.fetch(url)
+        except OSError:
+            raise ValueError(f"Could not retrieve remote path: {url}") from None
 
-        if parsed.scheme == "gh":
-            try:
-                user, repo, file_path = parsed.path.split("/", 2)
-            except ValueError:
-                raise ValueError(f"Invalid gh:// URL: {additional}")
-            branch = "master"
-            if "@" in file_path:
-                file_path, branch = file_path.split("@")
-            parsed = urlparse(
-                "https://raw.githubusercontent.com/"
-                f"{user}/{repo}/{branch}/{file_path}"
-            )
+    # Cloud files are read directly, no need to copy them locally
+    content = await PanPath(additional).a_read_text()
+    key = sha256(
+        json.dumps([content, kwargs], sort_keys=True, default=str).encode()
+    ).hexdigest()
 
-        url = parsed.geturl()
-        cache_key = sha256(url.encode("utf-8")).hexdigest()
-        additional = cache_dir / f"{cache_key}-{parsed.path.split('/')[-1]}"
-        if not await additional.a_exists():
-            try:
-                urlretrieve(url, additional)
-            except URLError:
-                raise ValueError(
-                    f"Could not retrieve remote path: {additional}"
-                ) from None
+    parsed_file = cache_dir / f"{key}.parsed.json"
+    try:
+        return json.loads(await parsed_file.a_read_text())
+    except (OSError, ValueError):
+        pass
 
     if kwargs:
         # kwargs passed, treat the file as a template
-        additional = PanPath(additional)
-        tpl = Liquid(await additional.a_read_text(), mode="wild", from_file=False)
-        additional = cache_dir.joinpath(
-            f"{slugify(str(await additional.a_resolve()))}.rendered{additional.suffix}"
-        )
-        await additional.a_write_text(tpl.render(**kwargs))
-
-    else:
-        additional = PanPath(additional)
-        if isinstance(additional, CloudPath):
-            dig = sha256(str(additional).encode()).hexdigest()
-            local_add = cache_dir.joinpath(
-                f"{additional.stem}.{dig}{additional.suffix}"
-            )
-            await additional.a_copy(local_add)
-            additional = local_add
+        tpl = Liquid(content, mode="wild", from_file=False)
+        content = tpl.render(**kwargs)
 
-    out = Config.load(await additional.a_read_text(), loader="tomls")
+    out = Config.load(content, loader="tomls")
     if "ADDITIONAL_OPTIONS" in out:
         for val in out["ADDITIONAL_OPTIONS"].values():
             _get_default(val)
 
+    # Keep plain dicts, the same as loaded from the disk
+    out = json.loads(json.dumps(out, default=str))
+    await parsed_file.a_write_text(json.dumps(out))
+    _evict_cache(
+        ADDITIONAL_CACHE_DIR,
+        ADDITIONAL_CACHE_MAX_SIZE,
+        ADDITIONAL_CACHE_MAX_AGE,
+    )
+    return out
+
+
+# The statuses of the jobs without rc files, by the codes in their status
+# files written by xqute, the others are failed
+UNFINISHED_JOB_STATUS = {2: "queued", 3: "submitted", 4: "running", 5: "killed"}
+
+# The keys of the config data of a process needed to render the navigation
+PROC_SKELETON_KEYS = ("is_start", "order", "hidden")
+
+
+def _proc_skeleton(argspec: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Stub the config data of a process, with the details loaded on demand"""
+    out = {key: argspec[key] for key in PROC_SKELETON_KEYS if key in argspec}
+    out["lazy"] = True
     return out
 
 
+def _index_workdir(workdir: str | PanPath) -> str:
+    """The working directory of a pipeline as recorded in the job index
+
+    The local paths are resolved, as the pipeline may be run from a
+    different directory than the server.
+    """
+    workdir = str(workdir)
+    if "://" in workdir:
+        return workdir
+    return Path(workdir).resolve().as_posix()
+
+
+def _legacy_procs(procs: Mapping[str, Any]) -> Mapping[str, Any]:
+    """The run data of the processes with the job statuses as lists"""
+    return {
+        proc: {**procdata, "jobs": list(procdata["jobs"])}
+        for proc, procdata in procs.items()
+    }
+
+
+def _proc_from_index(procinfo: Mapping[str, Any] | None) -> Mapping[str, Any]:
+    """Restore the run data of a process from the job index"""
+    if procinfo is None:
+        # Never started in the run
+        return {"jobs": JobStatuses(), "status": "init"}
+
+    jobs = JobStatuses(procinfo["njobs"])
+    for job, status in procinfo["jobs"].items():
+        if job < len(jobs):
+            jobs[job] = "succeeded" if status == "cached" else status
+
+    # Still running when the run completed, i.e. interrupted
+    status = procinfo["status"]
+    return {"jobs": jobs, "status": "failed" if status == "running" else status}
+
+
+def _resolve_additional(args: Namespace) -> str | None:
+    """Get the additional config file from the CLI arguments"""
+    if args.additional == "auto" and args.pipeline.rpartition(":")[0].endswith(".py"):
+        return str(Path(__file__).parent.joinpath("additional_auto.toml"))
+    return args.additional
+
+
 # def _update_dict(d1: Mapping[str, Any], d2: Mapping[str, Any]) -> None:
 #     """Update d1 with d2 recursively"""
 #     for key, val in d2.items():
@@ -337,6 +495,75 @@ async def _load_additional(additional: str, **kwargs) -> Mapping[str, Any]:
 #             _update_dict(d1[key], val)
 #         else:
 #             d1[key] = val
+
+
+# The pipeline being loaded, inherited by the forked argspec workers
+_PIPELINE = None
+# The min number of processes in a pipeline to generate the argspecs in parallel
+PARALLEL_ARGSPEC_MIN_PROCS = 8
+
+
+def _argspec_worker(i: int) -> Mapping[str, Any]:
+    """Generate the argspec of the i-th process of the pipeline being loaded"""
+    proc = _PIPELINE.procs[i]
+    logger.info("[bold][yellow]DBG[/yellow][/bold] Parsing process: %s ...", proc)
+    return _proc_to_argspec(
+        proc,
+        proc in _PIPELINE.starts,
+        get_marked(proc, "board_config_hidden", False),
+        order=i,
+    )
+
+
+def _procs_to_argspecs(pipeline: Pipen) -> List[Mapping[str, Any]]:
+    """Generate the argspecs of the processes of the pipeline, in order
+
+    Parsing the docstrings dominates the loading of large pipelines, so the
+    work is fanned out to forked processes, which inherit the loaded pipeline
+    and only send the argspecs back.
+
+    Forking is only used on Linux, and only when no other threads are
+    running, as forking is unsafe on macOS and with threads holding locks.
+    The forked processes never touch the event loop of the loader.
+    Otherwise, or if anything goes wrong, the processes are parsed serially.
+    """
+    global _PIPELINE
+
+    n_procs = len(pipeline.procs)
+    n_workers = min(n_procs, os.cpu_count() or 1)
+    _PIPELINE = pipeline
+    try:
+        if (
+            n_procs >= PARALLEL_ARGSPEC_MIN_PROCS
+            and n_workers > 1
+            and sys.platform.startswith("linux")
+            and "fork" in get_all_start_methods()
+            and threading.active_count() == 1
+        ):
+            try:
+                with ProcessPoolExecutor(
+                    n_workers,
+                    mp_context=get_context("fork"),
+                ) as executor:
+                    return list(
+                        executor.map(
+                            _argspec_worker,
+                            range(n_procs),
+                            chunksize=-(-n_procs // n_workers),
+                        )
+                    )
+            except Exception as exc:
+                logger.warning(
+                    "Failed to parse the processes in parallel (%s), "
+                    "falling back to sequential parsing.",
+                    exc,
+                )
+
+        return [_argspec_worker(i) for i in range(n_procs)]
+    finally:
+        _PIPELINE = None
+
+
 async def _get_config_data(
     args: Namespace,
     name: str | None,
@@ -393,17 +620,13 @@ async def _get_config_data(
             }
 
         pg_sec = {}
-        for i, proc in enumerate(pipeline.procs):
-            logger.info(
-                "[bold][yellow]DBG[/yellow][/bold] Parsing process: %s ...",
-                proc,
-            )
-
+        argspecs = _procs_to_argspecs(pipeline)
+        for proc, argspec in zip(pipeline.procs, argspecs):
             pg = proc.__meta__["procgroup"]
             if pg:
                 if pg.name not in pg_sec:
                     pg_sec[pg.name] = {"PROCESSES": {}}
-                    pg_anno = annotate(pg.__class__)
+                    pg_anno = _annotate(pg.__class__)
                     # desc
                     pg_summ = pg_anno.get("Summary", {"short": "", "long": ""})
                     pg_sec[pg.name][
@@ -416,36 +639,23 @@ async def _get_config_data(
                     #     arginfo["value"] = pg.DEFAULTS.get(arg)
                     pg_sec[pg.name]["ARGUMENTS"] = pg_args
 
-                pg_sec[pg.name][SECTION_PROCESSES][proc.name] = _proc_to_argspec(
-                    proc,
-                    proc in pipeline.starts,
-                    get_marked(proc, "board_config_hidden", False),
-                    order=i,
-                )
+                pg_sec[pg.name][SECTION_PROCESSES][proc.name] = argspec
             else:
-                data[SECTION_PROCESSES][proc.name] = _proc_to_argspec(
-                    proc,
-                    proc in pipeline.starts,
-                    get_marked(proc, "board_config_hidden", False),
-                    order=i,
-                )
+                data[SECTION_PROCESSES][proc.name] = argspec
 
         data[SECTION_PROCGROUPS] = pg_sec
+        # Generated the same way as the options of the processes
+        data[SECTION_TEMPLATES] = {
+            key: _proc_option(key) for key in PROC_OPTION_TEMPLATES
+        }
 
         if args.additional:
             logger.info(
                 "[bold][yellow]DBG[/yellow][/bold] "
                 "Loading additional configuration items ..."
             )
-            if args.additional == "auto" and args.pipeline.rpartition(":")[0].endswith(
-                ".py"
-            ):
-                additional = str(Path(__file__).parent.joinpath("additional_auto.toml"))
-            else:
-                additional = args.additional
-
             addi_data = await _load_additional(
-                additional,
+                _resolve_additional(args),
                 name=name or pipeline.name,
                 pipeline=args.pipeline,
                 pipeline_args=args.pipeline_args,
@@ -461,81 +671,409 @@ async def _get_config_data(
     return data
 
 
-def _config_data_worker(conn, args, name):
-    """Worker function for multiprocessing to load config data"""
+def _load_pipeline(args: Namespace, name: str | None) -> Mapping[str, Any]:
+    """Load the pipeline and generate the config data, in a loader process"""
     try:
-        msg = json.dumps(asyncio.run(_get_config_data(args, name))).encode()
+        data = asyncio.run(_get_config_data(args, name))
     except Exception as exc:
-        msg = json.dumps({"error": str(exc)}).encode()
+        data = {"error": str(exc)}
+
+    return {"data": data}
+
+
+# The cache of the config data generated from the pipelines
+CONFIG_CACHE_DIR = Path(gettempdir()) / "pipen-board-config-cache"
+# The cache dir is trimmed to this size in bytes, the oldest files go first
+CONFIG_CACHE_MAX_SIZE = 256 * 1024 * 1024
+# The cached config data older than this in seconds are removed
+CONFIG_CACHE_MAX_AGE = 7 * 24 * 3600
 
-    conn.send(msg)
-    conn.close()
+
+def _load_config_data(
+    args: Namespace,
+    name: str | None,
+    pool: LoaderPool,
+) -> Mapping[str, Any]:
+    """Load the config data from the cache, or from the pipeline
+
+    This blocks, and is supposed to run in a thread.
+
+    Returns:
+        A dict with the config data as `data` and the files of the modules
+        imported by the pipeline as `modules`
+    """
+    cache_key = _config_cache_key(args, name)
+    cached = cache_key and _load_config_cache(cache_key)
+    if cached:
+        return cached
+
+    # Load the pipeline in another process to get a clean environment
+    # to avoid conflicts
+    result = pool.load(args, name)
+    if cache_key and "error" not in result["data"]:
+        _save_config_cache(cache_key, result["data"], result["modules"])
+    return result
+
+
+def _config_cache_key(args: Namespace, name: str | None) -> str | None:
+    """The key of the cached config data
+
+    Composed of the pipeline, its arguments, the name of the instance and
+    the content of the additional file. The modules imported by the
+    pipeline are checked when the cache is loaded.
+
+    The remote additional files are fetched (revalidated by the fetcher)
+    to get the content.
+
+    Returns:
+        The key, None if the additional file can't be read, so that the
+        cache is not used
+    """
+    additional = _resolve_additional(args)
+    if additional:
+        try:
+            url = _additional_url(additional)
+            path = fetcher.fetch_sync(url) if url else PanPath(additional)
+            additional = sha256(path.read_bytes()).hexdigest()
+        except (OSError, ValueError):
+            return None
+
+    return sha256(
+        json.dumps(
+            [__version__, args.pipeline, args.pipeline_args, name, additional]
+        ).encode()
+    ).hexdigest()
+
+
+def _load_config_cache(key: str) -> Mapping[str, Any] | None:
+    """Load the cached config data, None if missing or outdated
+
+    Returns:
+        A dict with the config data as `data` and the files that the config
+        data depends on as `modules`
+    """
+    cache_file = CONFIG_CACHE_DIR / f"{key}.json"
+    try:
+        cached = json.loads(cache_file.read_text())
+    except (OSError, ValueError):
+        return None
+
+    for path, sig in cached["modules"].items():
+        if file_signature(path) != sig:
+            logger.debug(
+                "[bold][yellow]DBG[/yellow][/bold] Config cache outdated by: %s",
+                path,
+            )
+            return None
+
+    return {"data": cached["data"], "modules": list(cached["modules"])}
+
+
+def _save_config_cache(key: str, data: Mapping[str, Any], modules: List[str]):
+    """Save the config data to the cache
+
+    Args:
+        key: The key of the cache
+        data: The config data
+        modules: The files of the modules imported by the pipeline
+    """
+    # The modules of this package affect how the data is generated
+    modules = [*modules, *map(str, Path(__file__).parent.glob("*.py"))]
+    try:
+        CONFIG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        CONFIG_CACHE_DIR.joinpath(f"{key}.json").write_text(
+            json.dumps(
+                {
+                    "modules": {path: file_signature(path) for path in modules},
+                    "data": data,
+                }
+            )
+        )
+    except OSError as exc:  # pragma: no cover
+        logger.warning("Failed to save config cache: %s", exc)
+    else:
+        _evict_cache(CONFIG_CACHE_DIR, CONFIG_CACHE_MAX_SIZE, CONFIG_CACHE_MAX_AGE)
 
 
 class DataManager:
     """Gather and manager the pipeline data"""
 
-    # Send data every 5 seconds to the client, via websocket
-    INTERVAL = 5
+    # The max number of concurrent reads of the files of the previous run
+    PREV_RUN_CONCURRENCY = 64
+    # The seconds the log of the previous run can be modified after the last
+    # update of the run in the index, otherwise the index is outdated
+    INDEX_MTIME_SLACK = 60
+    # The rc files modified this many seconds before the last scan of their
+    # processes are read again, for the clock skews of network filesystems
+    SCAN_MTIME_SLACK = 60
+    # The size of the tail of the log sent to a newly connected client
+    LOG_TAIL_SIZE = 64 * 1024
+    # The size of the chunks to read from the stdout of the pipeline
+    READ_SIZE = 64 * 1024
+    # The max number of the config data kept for the clients to load their
+    # processes on demand
+    MAX_CONFIGS = 8
+    # The max number of the logs of the previous runs kept for the clients
+    MAX_PREV_LOGS = 8
 
     def __init__(self) -> None:
         self.running: int | bool = False
+        # The sequence number of the last frame received from the plugin
+        self.pipeline_seq = 0
         self._config_data = None
+        # The config data loaded for the clients, by the configfile and preset
+        self._configs: OrderedDict[str, Mapping[str, Any]] = OrderedDict()
         self._run_data = None
-        self._timer = None
         self._command = None
+        # Set when there are changes to push to the clients
+        self._dirty: asyncio.Event | None = None
+        self._flusher: asyncio.Task | None = None
+        # The revision of the run data that the frontend has seen
+        self._revision = 0
+        # The pending changes of the run data, keyed by (op, *path)
+        self._patches: dict[tuple, Any] = {}
+        # Whether the run data is replaced and a full snapshot is needed
+        self._reset = True
+        # The log of the running pipeline, streamed separately
+        self._log = RunLog()
+        # The log of the previous run, when the pipeline is not run here
+        self._prev_log: LogFile | None = None
+        # The logs of the previous runs sent to the clients, by their ids,
+        # so that the earlier content is read from the same log
+        self._prev_logs: OrderedDict[str, LogFile] = OrderedDict()
+        self._prev_log_count = 0
+        # The loadings of the config data in flight, keyed by the name
+        self._loading: dict[Any, asyncio.Future] = {}
+        # The processes to load the pipelines
+        self.loader_pool = LoaderPool(size=0)
+        self._preload: asyncio.Task | None = None
+        # Watches the source files of the pipeline in dev mode, so that the
+        # config data loaded can be kept in memory until they change
+        self._watcher: FileWatcher | None = None
+        self._loaded: dict[Any, Mapping[str, Any]] = {}
+        # The index of the job statuses, and the id of the current run in it
+        self._index: JobIndex | None = None
+        self._index_run: int | None = None
+        # The statuses scanned from the process directories of the previous
+        # runs, with the signatures of the directories and the log, and when
+        # they were scanned
+        self._scan_cache: dict[str, Mapping[str, Any]] = {}
+
+    async def _load_config_data(
+        self,
+        args: Namespace,
+        name: str | None,
+    ) -> Mapping[str, Any]:
+        """Load the config data off the event loop
 
-    async def _get_config_data(
+        The concurrent requests for the same instance share the same loading.
+
+        Args:
+            args: The arguments from the CLI
+            name: The name of the instance of the pipeline
+
+        Returns:
+            A copy of the config data that the caller can modify
+        """
+        if self._watcher is not None and name in self._loaded:
+            return deepcopy(self._loaded[name])
+
+        future = self._loading.get(name)
+        if future is None:
+            future = asyncio.ensure_future(
+                asyncio.to_thread(_load_config_data, args, name, self.loader_pool)
+            )
+            self._loading[name] = future
+            future.add_done_callback(lambda _: self._loading.pop(name, None))
+
+        # Don't cancel the loading shared with others if this request is gone
+        result = await asyncio.shield(future)
+        data = result["data"]
+        if self._watcher is not None and "error" not in data:
+            self._loaded[name] = data
+            self._watcher.watch(result["modules"])
+        return deepcopy(data)
+
+    def open_index(self, path: str | Path) -> None:
+        """Open the index of the job statuses
+
+        Args:
+            path: The path to the database file, must be local
+        """
+        try:
+            self._index = JobIndex(path)
+        except Exception as exc:
+            logger.warning("Failed to open the job index %s: %s", path, exc)
+            self._index = None
+
+    async def close_index(self) -> None:
+        """Commit the pending writes and close the index"""
+        if self._index is not None:
+            await asyncio.to_thread(self._index.close)
+            self._index = None
+
+    async def _flush_index(self) -> None:
+        """Commit the pending writes to the index, in a thread"""
+        if self._index is None:
+            return
+        try:
+            await asyncio.to_thread(self._index.flush)
+        except Exception as exc:  # pragma: no cover
+            logger.error("Failed to write the job index: %s", exc)
+
+    async def _prev_run_from_index(
+        self,
+        name: str,
+        pipeline_dir: PanPath,
+        logfile: PanPath,
+    ) -> Mapping[str, Any] | None:
+        """Get the previous run from the index, None if not indexed or outdated
+
+        Args:
+            name: The name of the pipeline
+            pipeline_dir: The working directory of the pipeline
+            logfile: The log file of the previous run
+        """
+        if self._index is None:
+            return None
+
+        run = await asyncio.to_thread(
+            self._index.latest_run,
+            name,
+            _index_workdir(pipeline_dir),
+        )
+        if run is None or not run["finished"]:
+            return None
+
+        try:
+            mtime = (await logfile.a_stat()).st_mtime
+        except Exception:
+            return None
+        if mtime > run["updated"] + self.INDEX_MTIME_SLACK:
+            # Run again without the server watching
+            return None
+        return run
+
+    def start_watcher(self, args: Namespace, subscribers: Subscribers) -> None:
+        """Watch the source files of the pipeline in dev mode
+
+        The config data loaded is kept in memory, and only dropped when the
+        files change, then the web clients are notified.
+
+        Args:
+            args: The arguments from the CLI
+            subscribers: The pages watching the pipeline, to notify
+        """
+        if not args.dev:
+            return
+
+        async def on_changed(changed: List[str]) -> None:
+            self._loaded.clear()
+            subscribers.broadcast(
+                json.dumps({"type": "config_changed", "files": changed})
+            )
+
+        self._watcher = FileWatcher(on_changed)
+        additional = _resolve_additional(args)
+        if additional and Path(additional).is_file():
+            self._watcher.watch([str(Path(additional).resolve())])
+        self._watcher.start()
+
+    async def stop_watcher(self) -> None:
+        """Stop watching the source files of the pipeline"""
+        if self._watcher is not None:
+            await self._watcher.stop()
+            self._watcher = None
+            self._loaded.clear()
+
+    def start_loader(self, args: Namespace) -> None:
+        """Warm up the loader processes, and preload the pipeline
+
+        So that the first page load doesn't wait for the pipeline to load.
+
+        Args:
+            args: The arguments from the CLI
+        """
+        self.loader_pool = LoaderPool(args.loader_workers, args.loader_max_loads)
+        self.loader_pool.start()
+        self._preload = asyncio.create_task(self._load_config_data(args, None))
+        self._preload.add_done_callback(self._preloaded)
+
+    @staticmethod
+    def _preloaded(task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.warning("Failed to preload the pipeline: %s", exc)
+        elif "error" in task.result():
+            logger.warning("Failed to preload the pipeline, see errors on loading.")
+        else:
+            logger.info("Pipeline preloaded.")
+
+    async def stop_loader(self) -> None:
+        """Stop the loader processes"""
+        if self._preload is not None:
+            self._preload.cancel()
+            self._preload = None
+        await asyncio.to_thread(self.loader_pool.close)
+
+    async def _read_config_data(
         self,
         args: Namespace,
-        configfile: str,
-    ):
-        """Get the config data of the pipeline
+        configfile: str | None,
+    ) -> Mapping[str, Any]:
+        """Read the config data of the pipeline, without keeping it
 
         Args:
             args: The arguments from the CLI
             configfile: The name to the config file
+
+        Returns:
+            The config data, a new object every time
         """
         if configfile and not configfile.startswith("new:") and not args.dev:
-            self._config_data = json.loads(
-                await PanPath(args.workdir).joinpath(configfile).a_read_text()
-            )
-            return
+            config_data, _ = await load_config(args.schema_dir.joinpath(configfile))
+            return config_data
 
-        self._config_data = None
+        config_data = None
 
         if not configfile:
             name = None
         elif configfile.startswith("new:"):
             name = configfile[4:]
         else:
-            self._config_data = json.loads(
-                await args.schema_dir.joinpath(configfile).a_read_text()
-            )
-            name = self._config_data[SECTION_PIPELINE_OPTIONS]["name"]["value"]
-
-        if not self._config_data:
-            # Use multiprocessing to get a clean environment
-            # to load the pipeline to avoid conflicts
-            ctx = get_context("spawn")
-            parent_conn, child_conn = ctx.Pipe()
-            p = ctx.Process(target=_config_data_worker, args=(child_conn, args, name))
-            p.start()
-            data = parent_conn.recv()
-            p.join()
-
-            self._config_data = json.loads(data)
-            if "error" in self._config_data:
-                for line in self._config_data["error"].splitlines():
+            config_data, _ = await load_config(args.schema_dir.joinpath(configfile))
+            name = config_data[SECTION_PIPELINE_OPTIONS]["name"]["value"]
+
+        if not config_data:
+            config_data = await self._load_config_data(args, name)
+            if "error" in config_data:
+                for line in config_data["error"].splitlines():
                     logger.error(line)
 
                 from quart import abort
 
                 abort(500)
 
-        self._config_data[SECTION_PIPELINE_OPTIONS]["name"]["value"] = (
-            name or self._config_data[SECTION_PIPELINE_OPTIONS]["name"]["default"]
+        config_data[SECTION_PIPELINE_OPTIONS]["name"]["value"] = (
+            name or config_data[SECTION_PIPELINE_OPTIONS]["name"]["default"]
         )
+        return config_data
+
+    async def _get_config_data(
+        self,
+        args: Namespace,
+        configfile: str | None,
+    ):
+        """Get the config data of the pipeline
+
+        Args:
+            args: The arguments from the CLI
+            configfile: The name to the config file
+        """
+        self._config_data = None
+        self._config_data = await self._read_config_data(args, configfile)
 
     async def _get_prev_run(self, args: Namespace, configfile: str | None):
         """Get data for the previous run
@@ -547,32 +1085,42 @@ class DataManager:
                 It could also be "new:<name>" for a new instance.
         """
         out = self._run_data = {SECTION_LOG: None, "FINISHED": True}
+        self._prev_log = None
         await self._get_config_data(args, configfile=configfile)
         name = self._config_data[SECTION_PIPELINE_OPTIONS]["name"]["value"]
         pipeline_dir = PanPath(args.workdir).joinpath(name)
 
         if not await pipeline_dir.a_is_dir():
             # no previous run, return defaults
-            self._run_data = DEFAULT_RUN_DATA
+            self._run_data = deepcopy(DEFAULT_RUN_DATA)
             return
 
         # Get the log
         logfile = pipeline_dir.joinpath("run-latest.log")
         logsdir = pipeline_dir.joinpath(".logs")
-        if await logfile.a_exists() and await logfile.a_is_file():
-            out[SECTION_LOG] = await logfile.a_read_text()
-        elif await logsdir.a_is_dir():
+        if not (await logfile.a_exists() and await logfile.a_is_file()):
             # a wrong symlink, use the latest one from .logs
-            logfiles = sorted([x async for x in logsdir.a_glob("*.log")])
+            logfiles = (
+                sorted([x async for x in logsdir.a_glob("*.log")])
+                if await logsdir.a_is_dir()
+                else []
+            )
             if not logfiles:
                 # no previous run, return defaults
-                self._run_data = DEFAULT_RUN_DATA
+                self._run_data = deepcopy(DEFAULT_RUN_DATA)
                 return
-            out[SECTION_LOG] = await logfiles[-1].a_read_text()
-        else:
-            # no previous run, return defaults
-            self._run_data = DEFAULT_RUN_DATA
-            return
+            logfile = logfiles[-1]
+
+        # Only the tail of the log, the earlier content can be fetched by
+        # /api/run/log
+        self._prev_log = LogFile(logfile)
+        out[SECTION_LOG_ID] = self._add_prev_log(self._prev_log)
+        out[SECTION_LOG_START] = await self._prev_log.line_start(
+            await self._prev_log.get_size() - self.LOG_TAIL_SIZE
+        )
+        out[SECTION_LOG] = (
+            await self._prev_log.read(out[SECTION_LOG_START])
+        ).decode(errors="replace")
 
         config_data = self._config_data
         outdir = config_data[SECTION_PIPELINE_OPTIONS].get(
@@ -598,43 +1146,159 @@ class DataManager:
         out[SECTION_PROCESSES] = {}
         out[SECTION_PROCGROUPS] = {}
 
-        async def process_proc(proc: str, container: dict):
-            procdir = pipeline_dir.joinpath(proc)
-            container[proc] = {"jobs": []}
-            if not await procdir.a_is_dir():
-                container[proc]["status"] = "init"
-                return
+        procs = [(None, proc) for proc in config_data[SECTION_PROCESSES]]
+        for pg in config_data[SECTION_PROCGROUPS]:
+            out[SECTION_PROCGROUPS][pg] = {}
+            procs.extend(
+                (pg, proc)
+                for proc in config_data[SECTION_PROCGROUPS][pg][SECTION_PROCESSES]
+            )
+
+        indexed = await self._prev_run_from_index(name, pipeline_dir, logfile)
+        if indexed is not None:
+            for pg, proc in procs:
+                procdata = _proc_from_index(indexed["procs"].get((pg, proc)))
+                if pg is None:
+                    out[SECTION_PROCESSES][proc] = procdata
+                else:
+                    out[SECTION_PROCGROUPS][pg][proc] = procdata
+            self._rebuild_summary()
+            return
+
+        # The jobs are only changed by the runs, which always write the log,
+        # so the processes with their directories unchanged since the log was
+        # last modified are reused as is
+        log_sig = await asyncio.to_thread(file_signature, logfile)
+        # Bound the concurrent reads, for network filesystems and cloud storage
+        sem = asyncio.Semaphore(self.PREV_RUN_CONCURRENCY)
+
+        async def read_job(
+            jobdir: PanPath,
+            cached: str | None,
+            scanned: float,
+            has_rc: bool = True,
+        ) -> tuple:
+            """Read the status of a job, from its rc file if it is finished,
+            otherwise from its status file
+
+            Args:
+                jobdir: The directory of the job
+                cached: The status read from the rc file in the last scan
+                scanned: When the last scan started
+                has_rc: Whether the job may have the rc file, False if it is
+                    not listed
+
+            Returns:
+                Whether the job is finished, and its status
+            """
+            rcfile = jobdir / "job.rc"
+            async with sem:
+                if cached is not None:
+                    # Only read again if modified since the last scan
+                    sig = await asyncio.to_thread(file_signature, rcfile)
+                    since = (scanned - self.SCAN_MTIME_SLACK) * 1e9
+                    if sig is not None and sig[0] < since:
+                        return True, cached
+                try:
+                    rc = int((await rcfile.a_read_text()).strip()) if has_rc else None
+                except FileNotFoundError:
+                    rc = None
+                except Exception:
+                    return True, "failed"
+                if rc is not None:
+                    return True, "succeeded" if rc == 0 else "failed"
 
-            for jobdir in sorted(
-                [j async for j in procdir.a_iterdir() if j.name.isdigit()],
-                key=lambda x: int(x.name),
-            ):
-                rcfile = jobdir / "job.rc"
                 try:
-                    rc = int((await rcfile.a_read_text()).strip())
+                    code = int((await jobdir.joinpath("job.status").a_read_text()))
                 except Exception:
-                    container[proc]["jobs"].append("failed")
+                    code = None
+            return False, UNFINISHED_JOB_STATUS.get(code, "failed")
+
+        async def process_proc(proc: str) -> Mapping[str, Any]:
+            procdir = pipeline_dir.joinpath(proc)
+            cached = self._scan_cache.get(str(procdir))
+            async with sem:
+                if not await procdir.a_is_dir():
+                    return {"jobs": JobStatuses(), "status": "init"}
+
+                sig = (await asyncio.to_thread(file_signature, procdir), log_sig)
+                if cached and log_sig is not None and cached["sig"] == sig:
+                    return deepcopy(cached["result"])
+
+                scanned = time.time()
+                jobdirs = sorted(
+                    [j async for j in procdir.a_iterdir() if j.name.isdigit()],
+                    key=lambda x: int(x.name),
+                )
+                if isinstance(procdir, CloudPath):
+                    # List the rc files in one pass instead of probing each job
+                    rcfiles = {
+                        rcfile.parent.name
+                        async for rcfile in procdir.a_glob("*/job.rc")
+                    }
                 else:
-                    container[proc]["jobs"].append("succeeded" if rc == 0 else "failed")
-            if not container[proc]["jobs"]:
-                container[proc]["status"] = "init"
-            elif "failed" in container[proc]["jobs"]:
-                container[proc]["status"] = "failed"
+                    rcfiles = None
+
+            # The statuses read from the rc files are final, the rc files are
+            # only stat'ed then, the others are read again
+            cached_jobs = cached["jobs"] if cached else {}
+            read = await asyncio.gather(
+                *(
+                    read_job(
+                        jobdir,
+                        cached_jobs.get(jobdir.name),
+                        cached["scanned"] if cached else scanned,
+                        rcfiles is None or jobdir.name in rcfiles,
+                    )
+                    for jobdir in jobdirs
+                )
+            )
+            jobs = JobStatuses(len(jobdirs), "failed")
+            for i, (_, status) in enumerate(read):
+                jobs[i] = status
+
+            if not jobs:
+                status = "init"
+            elif "failed" in jobs:
+                status = "failed"
+            elif all(job == "succeeded" for job in jobs):
+                status = "succeeded"
             else:
-                container[proc]["status"] = "succeeded"
+                status = "running"
+            result = {"jobs": jobs, "status": status}
+            self._scan_cache[str(procdir)] = {
+                "sig": sig,
+                "scanned": scanned,
+                "jobs": {
+                    jobdir.name: status
+                    for jobdir, (finished, status) in zip(jobdirs, read)
+                    if finished
+                },
+                "result": deepcopy(result),
+            }
+            return result
 
-        for proc in config_data[SECTION_PROCESSES]:
-            await process_proc(proc, out[SECTION_PROCESSES])
+        results = await asyncio.gather(*(process_proc(proc) for _, proc in procs))
+        for (pg, proc), result in zip(procs, results):
+            if pg is None:
+                out[SECTION_PROCESSES][proc] = result
+            else:
+                out[SECTION_PROCGROUPS][pg][proc] = result
 
-        for pg in config_data[SECTION_PROCGROUPS]:
-            out[SECTION_PROCGROUPS][pg] = {}
-            for proc in config_data[SECTION_PROCGROUPS][pg][SECTION_PROCESSES]:
-                await process_proc(proc, out[SECTION_PROCGROUPS][pg])
+        self._rebuild_summary()
 
-    def _update_config_by_preset(self, preset: Mapping[str, Any] | None):
+    def _update_config_by_preset(
+        self,
+        preset: Mapping[str, Any] | None,
+        config_data: Mapping[str, Any] | None = None,
+    ):
+        """Update the config data (default the current one) with the preset"""
         if not preset:
             return
 
+        if config_data is None:
+            config_data = self._config_data
+
         def update_value(key, value, preset_val, force_ns=False):
             if not preset_val or key not in preset_val:
                 return
@@ -652,22 +1316,22 @@ class DataManager:
                 if value.get("pgarg"):
                     value["changed"] = True
 
-        # fill up the default value of self._config_data with preset
-        if SECTION_PIPELINE_OPTIONS in self._config_data:
-            for key, val in self._config_data[SECTION_PIPELINE_OPTIONS].items():
+        # fill up the default value of the config data with preset
+        if SECTION_PIPELINE_OPTIONS in config_data:
+            for key, val in config_data[SECTION_PIPELINE_OPTIONS].items():
                 update_value(key, val, preset, force_ns=key.endswith("_opts"))
 
-        if SECTION_ADDITIONAL_OPTIONS in self._config_data:
-            for key, val in self._config_data[SECTION_ADDITIONAL_OPTIONS].items():
+        if SECTION_ADDITIONAL_OPTIONS in config_data:
+            for key, val in config_data[SECTION_ADDITIONAL_OPTIONS].items():
                 update_value(key, val, preset)
 
-        if SECTION_PROCESSES in self._config_data:
-            for proc, procconfig in self._config_data[SECTION_PROCESSES].items():
+        if SECTION_PROCESSES in config_data:
+            for proc, procconfig in config_data[SECTION_PROCESSES].items():
                 for key, val in procconfig["value"].items():
                     update_value(key, val, preset.get(proc), force_ns=key == "envs")
 
-        if SECTION_PROCGROUPS in self._config_data:
-            for pg, pgconfig in self._config_data[SECTION_PROCGROUPS].items():
+        if SECTION_PROCGROUPS in config_data:
+            for pg, pgconfig in config_data[SECTION_PROCGROUPS].items():
                 if "ARGUMENTS" in pgconfig:
                     for key, val in pgconfig["ARGUMENTS"].items():
                         update_value(key, val, preset.get(pg))
@@ -678,89 +1342,630 @@ class DataManager:
                                 key, val, preset.get(proc), force_ns=key == "envs"
                             )
 
-    def clear_run_data(self, keep_log: bool = False):
-        """Clear the data"""
+    def clear_run_data(
+        self,
+        keep_log: bool = False,
+        log_file: str | Path | None = None,
+    ):
+        """Clear the data
+
+        Args:
+            keep_log: Whether to keep the log
+            log_file: The file to spill the older log lines to
+        """
+        self._run_data = deepcopy(DEFAULT_RUN_DATA)
+        self._rebuild_summary()
         if not keep_log:
-            self._run_data = deepcopy(DEFAULT_RUN_DATA)
+            self._log.clear(log_file)
+            self._prev_log = None
+
+        # The frontend needs a full snapshot of the new run data
+        self._patches.clear()
+        self._reset = True
+        self._mark_dirty()
+
+    def _patch(self, path: Sequence[str | int], value: Any) -> None:
+        """Set the value at the path of the run data and record the change
+
+        Args:
+            path: The keys/indexes to the value in the run data
+            value: The new value
+        """
+        target = self._run_data
+        for key in path[:-1]:
+            target = target[key]
+        target[path[-1]] = value
+
+        key = ("set", *path)
+        # Move the change to the end so it is applied after its parents
+        self._patches.pop(key, None)
+        self._patches[key] = value
+        self._mark_dirty()
+
+    def _rebuild_summary(self) -> None:
+        """Count the processes and jobs in each status from scratch
+
+        This is only done when the processes are (re-)initialized, the
+        counters are then updated on the transitions.
+        """
+        summary = {"pipeline": _new_counter(), "procgroups": {}}
+
+        def add(counters, procdata):
+            for counter in counters:
+                _move_count(counter["procs"], None, procdata.get("status", "init"))
+                for status, n in procdata["jobs"].counts.items():
+                    _move_count(counter["jobs"], None, status, n)
+
+        for procdata in self._run_data.get(SECTION_PROCESSES, {}).values():
+            add([summary["pipeline"]], procdata)
+
+        for pg, procs in self._run_data.get(SECTION_PROCGROUPS, {}).items():
+            summary["procgroups"][pg] = _new_counter()
+            for procdata in procs.values():
+                add([summary["pipeline"], summary["procgroups"][pg]], procdata)
+
+        self._run_data[SECTION_SUMMARY] = summary
+
+    def _count(
+        self,
+        group: str | None,
+        kind: str,
+        old: str | None,
+        new: str | None,
+        n: int = 1,
+    ) -> None:
+        """Update the counters of the pipeline and the procgroup on a transition
+
+        Args:
+            group: The procgroup of the process
+            kind: Either "procs" or "jobs"
+            old: The old status
+            new: The new status
+            n: The number of processes/jobs
+        """
+        summary = self._run_data[SECTION_SUMMARY]
+        _move_count(summary["pipeline"][kind], old, new, n)
+        if group:
+            counter = summary["procgroups"].setdefault(group, _new_counter())
+            _move_count(counter[kind], old, new, n)
+
+        self._patch([SECTION_SUMMARY], summary)
+
+    def get_summary(self) -> Mapping[str, Any]:
+        """Get the progress of the run without the statuses of the jobs"""
+        run_data = self._run_data or DEFAULT_RUN_DATA
+        processes = {}
+        for proc, procdata in run_data[SECTION_PROCESSES].items():
+            processes[proc] = {
+                "status": procdata.get("status", "init"),
+                "jobs": procdata["jobs"].counts,
+            }
+        for pg, procs in run_data[SECTION_PROCGROUPS].items():
+            for proc, procdata in procs.items():
+                processes[proc] = {
+                    "procgroup": pg,
+                    "status": procdata.get("status", "init"),
+                    "jobs": procdata["jobs"].counts,
+                }
+
+        return {
+            "running": bool(self.running),
+            "finished": run_data["FINISHED"],
+            "revision": self._revision,
+            **(run_data[SECTION_SUMMARY] or {
+                "pipeline": _new_counter(),
+                "procgroups": {},
+            }),
+            "processes": processes,
+        }
+
+    def _proc_path(self, proc: str, group: str | None) -> List[str]:
+        """Get the path to the process in the run data"""
+        if not group:
+            return [SECTION_PROCESSES, proc]
+        return [SECTION_PROCGROUPS, group, proc]
+
+    def _get_proc(self, proc: str, group: str | None) -> Mapping[str, Any]:
+        """Get the data of the process in the run data"""
+        if not group:
+            return self._run_data[SECTION_PROCESSES][proc]
+        return self._run_data[SECTION_PROCGROUPS][group][proc]
+
+    def _dump_patches(self) -> str | None:
+        """Dump the pending changes as a patch message and bump the revision"""
+        if self._reset:
+            self._reset = False
+            self._patches.clear()
+            self._revision += 1
+            return self._dump_snapshot()
+
+        if not self._patches:
+            return None
+
+        ops = [
+            {"op": "set", "path": list(key[1:]), "value": value}
+            for key, value in self._patches.items()
+        ]
+        self._patches.clear()
+        base = self._revision
+        self._revision += 1
+        return json.dumps(
+            {"type": "patch", "base": base, "rev": self._revision, "ops": ops},
+            default=json_default,
+        )
+
+    def _dump_snapshot(self) -> str:
+        """Dump the whole run data as a snapshot message"""
+        return json.dumps(
+            {"type": "snapshot", "rev": self._revision, "data": self._run_data},
+            default=json_default,
+        )
+
+    def _config_skeleton(self) -> Mapping[str, Any]:
+        """The config data with the processes stubbed, see `_proc_skeleton`"""
+        config = self._config_data.copy()
+        config[SECTION_PROCESSES] = {
+            proc: _proc_skeleton(argspec)
+            for proc, argspec in config[SECTION_PROCESSES].items()
+        }
+        config[SECTION_PROCGROUPS] = {
+            group: {
+                **groupinfo,
+                SECTION_PROCESSES: {
+                    proc: _proc_skeleton(argspec)
+                    for proc, argspec in groupinfo[SECTION_PROCESSES].items()
+                },
+            }
+            for group, groupinfo in config.get(SECTION_PROCGROUPS, {}).items()
+        }
+        return config
+
+    @staticmethod
+    def _config_key(
+        configfile: str | None,
+        preset: Mapping[str, Any] | None,
+    ) -> str:
+        """The key of the config data loaded with the configfile and preset"""
+        return json.dumps([configfile or None, preset or None], default=str)
+
+    def _remember_config(self, key: str, config_data: Mapping[str, Any]) -> None:
+        """Keep the config data sent to a client, for its processes to load"""
+        self._configs[key] = config_data
+        self._configs.move_to_end(key)
+        while len(self._configs) > self.MAX_CONFIGS:
+            self._configs.popitem(last=False)
+
+    async def get_proc_config(
+        self,
+        args: Namespace,
+        proc: str,
+        procgroup: str | None = None,
+        configfile: str | None = None,
+        preset: Mapping[str, Any] | None = None,
+    ) -> Mapping[str, Any] | None:
+        """Get the config data of a process, None if not found
+
+        The process is resolved from the config data loaded with the same
+        configfile and preset, not the last loaded one, as the clients may
+        load different configurations.
+
+        Args:
+            args: The arguments from the CLI
+            proc: The name of the process
+            procgroup: The name of the process group the process belongs to
+            configfile: The config file that the client loaded with
+            preset: The preset that the client loaded with
+        """
+        key = self._config_key(configfile, preset)
+        config_data = self._configs.get(key)
+        if config_data is None:
+            # Forgotten, or the server is restarted
+            config_data = await self._read_config_data(args, configfile)
+            self._update_config_by_preset(preset, config_data)
+            self._remember_config(key, config_data)
+
+        if procgroup:
+            section = config_data.get(SECTION_PROCGROUPS, {}).get(procgroup)
+            section = section and section[SECTION_PROCESSES]
         else:
-            log = self._run_data[SECTION_LOG]
-            self._run_data = deepcopy(DEFAULT_RUN_DATA)
-            self._run_data[SECTION_LOG] = log
+            section = config_data.get(SECTION_PROCESSES)
+        argspec = section and section.get(proc)
+        if argspec is None:
+            return None
+        return compact_proc(argspec, config_data.get(SECTION_TEMPLATES))
+
+    async def get_pristine_config(
+        self,
+        args: Namespace,
+    ) -> Mapping[str, Any] | None:
+        """Get the config data generated from the pipeline, without changes
+
+        Used as the base of the saved configurations.
+
+        Args:
+            args: The arguments from the CLI
+
+        Returns:
+            The config data, None if the pipeline fails to load
+        """
+        config_data = await self._load_config_data(args, None)
+        if "error" in config_data:
+            return None
+        return config_data
 
     async def get_data(
         self,
         args: Namespace,
         configfile: str | None,
         preset: Mapping[str, Any] | None,
+        skeleton: bool = False,
+        legacy: bool = False,
     ):
-        """Get the data"""
+        """Get the data
+
+        Args:
+            args: The arguments from the CLI
+            configfile: The name to the config file
+            preset: The preset values to update the config data
+            skeleton: Whether to stub the config data of the processes, which
+                are then loaded by `get_proc_config` on demand
+            legacy: Whether the data is for a frontend before the protocol
+                was versioned, see `_legacy_run_data`
+        """
         if not self.running:
             await self._get_prev_run(args, configfile=configfile)
-            self._update_config_by_preset(preset)
+        else:
+            await self._get_config_data(args, configfile=configfile)
+
+        self._update_config_by_preset(preset)
+        if legacy:
             return {
-                "runStarted": False,
-                "config": self._config_data,
-                "run": self._run_data,
+                "runStarted": bool(self.running),
+                "config": strip_templates(self._config_data),
+                "run": await self._legacy_run_data(),
             }
 
-        await self._get_config_data(args, configfile=configfile)
-        self._update_config_by_preset(preset)
+        if skeleton:
+            self._remember_config(
+                self._config_key(configfile, preset),
+                self._config_data,
+            )
         return {
-            "runStarted": True,
-            "config": self._config_data,
+            "runStarted": bool(self.running),
+            "config": compact_config(
+                self._config_skeleton() if skeleton else self._config_data
+            ),
             "run": self._run_data,
+            # Whether the clients are notified when the pipeline changes
+            "watching": self._watcher is not None,
+        }
+
+    async def _legacy_run_data(self) -> Mapping[str, Any]:
+        """The run data for the frontends before the protocol was versioned
+
+        The statuses of the jobs as lists, and the whole log instead of the
+        tail, as those frontends don't fetch the earlier content.
+        """
+        out = {
+            key: val
+            for key, val in self._run_data.items()
+            if key not in (SECTION_LOG_ID, SECTION_LOG_START)
+        }
+        out[SECTION_PROCESSES] = _legacy_procs(out.get(SECTION_PROCESSES) or {})
+        out[SECTION_PROCGROUPS] = {
+            group: _legacy_procs(procs)
+            for group, procs in (out.get(SECTION_PROCGROUPS) or {}).items()
         }
+        if out.get(SECTION_LOG) is not None:
+            if self._prev_log is not None:
+                log = await self._prev_log.read()
+            else:
+                log = self._log.read(0)
+            out[SECTION_LOG] = strip_partial_char(log).decode(errors="replace")
+        return out
 
-    async def send_run_data(self, ws, force: bool = False):
-        if ws is None:
+    async def send_legacy_run_data(
+        self,
+        subscribers: Subscribers,
+        subscriber: Subscriber | None = None,
+    ):
+        """Send the whole run data to the legacy clients
+
+        Args:
+            subscribers: The web clients
+            subscriber: Only send to this client, if given, i.e. it is
+                newly connected
+        """
+        legacy = [
+            sub
+            for sub in ([subscriber] if subscriber else subscribers)
+            if sub.legacy
+        ]
+        if not legacy:
+            return
+
+        message = json.dumps(await self._legacy_run_data())
+        for sub in legacy:
+            # Whatever missed is in the whole run data
+            sub.stale = False
+            sub.offer(message)
+
+    def _tail_offset(self) -> int:
+        """The offset of the tail of the log sent to a new client"""
+        return self._log.line_start(self._log.size - self.LOG_TAIL_SIZE)
+
+    def _send_snapshot(self, subscriber: Subscriber, message: str) -> None:
+        """Send a snapshot to a subscriber, together with the tail of the log
+
+        Only the tail of the log is sent, the earlier content can be
+        fetched by /api/run/log
+        """
+        subscriber.stale = False
+        subscriber.log_offset = self._tail_offset()
+        subscriber.log_epoch = self._log.epoch
+        subscriber.offer(message)
+
+    async def send_run_snapshot(
+        self,
+        subscribers: Subscribers,
+        subscriber: Subscriber | None,
+    ):
+        """Send the whole run data to a newly connected (or resyncing) client
+
+        The pending changes are sent to the other clients first, so that
+        all the clients continue from the same revision.
+        """
+        if subscriber is None:
             return
-        if not force and time.time() - self._timer < self.INTERVAL:
+
+        if subscriber.legacy:
+            await self.send_legacy_run_data(subscribers, subscriber)
             return
 
-        # Send data
         logger.debug(
-            "[bold][yellow]DBG[/yellow][/bold] Sending run data to the frontend"
+            "[bold][yellow]DBG[/yellow][/bold] Sending run snapshot to the frontend"
         )
-        try:
-            await ws.send(json.dumps(self._run_data))
-        except BrokenPipeError:
-            pass
+        message = self._dump_patches()
+        if message is not None:
+            subscribers.broadcast(message, exclude=subscriber)
+
+        self._send_snapshot(subscriber, self._dump_snapshot())
+        self._send_log(subscribers)
+
+    def _send_log(self, subscribers: Subscribers):
+        """Send the new content of the log to the clients
+
+        The clients at the same offset share the same message.
+        """
+        groups = {}
+        for subscriber in subscribers:
+            if subscriber.stale or subscriber.legacy:
+                continue
+            if subscriber.log_epoch != self._log.epoch:
+                # The log is cleared for a new run
+                subscriber.log_epoch = self._log.epoch
+                subscriber.log_offset = 0
+            if subscriber.log_offset < self._log.size:
+                groups.setdefault(subscriber.log_offset, []).append(subscriber)
+
+        for offset, subs in groups.items():
+            # The rest of a character split by the chunks is sent next time
+            content = strip_partial_char(self._log.read(offset))
+            if not content:
+                continue
+            end = offset + len(content)
+            message = json.dumps(
+                {
+                    "type": "log",
+                    "log": self._run_log_id(),
+                    "offset": offset,
+                    "end": end,
+                    "data": content.decode(errors="replace"),
+                }
+            )
+            for subscriber in subs:
+                if subscriber.offer(message):
+                    subscriber.log_offset = end
+
+    def _run_log_id(self) -> str:
+        """The id of the log of the run here, changed when it is cleared"""
+        return f"run-{self._log.epoch}"
 
-        # Reset timer
-        self._timer = time.time()
+    def _add_prev_log(self, log: LogFile) -> str:
+        """Keep the log of a previous run sent to a client
 
-    async def on_start(self, data, ws):
+        Returns:
+            The id of the log, for the client to fetch the earlier content
+        """
+        self._prev_log_count += 1
+        log_id = f"file-{self._prev_log_count}"
+        self._prev_logs[log_id] = log
+        while len(self._prev_logs) > self.MAX_PREV_LOGS:
+            self._prev_logs.popitem(last=False)
+        return log_id
+
+    async def get_log(
+        self,
+        offset: int,
+        size: int | None,
+        log_id: str | None = None,
+    ) -> Mapping[str, Any]:
+        """Get a range of the log of the current/last run
+
+        The log of the previous run is read from the file, when the
+        pipeline is not run here since the server started.
+
+        Args:
+            offset: The start offset in bytes, moved to the start of the
+                next line if it is in the middle of a line, unless there is
+                no line starting in the range
+            size: The number of bytes to read, None to read to the end
+            log_id: The id of the log that the offset is in, sent with the
+                run data or the log. The offsets in a log cleared for a new
+                run, or of a log no longer kept, are rejected.
+                If not given, the current/last log is read.
+
+        Returns:
+            The content and the range of it, or the error
+        """
+        if log_id is None:
+            log = self._prev_log
+        elif log_id.startswith("file-"):
+            log = self._prev_logs.get(log_id)
+            if log is None:
+                return {"error": "The log is no longer available, reload the page."}
+        elif log_id == self._run_log_id():
+            log = None
+        else:
+            return {"error": "The log is cleared for a new run."}
+
+        if log is not None:
+            start = await log.line_start(offset)
+            total = await log.get_size()
+        else:
+            start = self._log.line_start(offset)
+            total = self._log.size
+
+        split = False
+        if size is not None:
+            if size > 0 and start >= offset + size:
+                # No line starts in the range, in the middle of a long line,
+                # which is then split, or the earlier content is never reached
+                start = offset
+                split = True
+            size = max(0, offset + size - start)
+        if log is not None:
+            content = await log.read(start, size)
+        else:
+            content = self._log.read(start, size)
+        if split:
+            stripped = lstrip_partial_char(content)
+            start += len(content) - len(stripped)
+            content = stripped
+        return {
+            "offset": start,
+            "end": start + len(content),
+            "total": total,
+            "content": content.decode(errors="replace"),
+        }
+
+    def _mark_dirty(self) -> None:
+        """Let the flusher know that there are changes to send"""
+        if self._dirty is not None:
+            self._dirty.set()
+
+    def start_flusher(self, subscribers: Subscribers, interval: float) -> None:
+        """Start the task to push the changes to the clients
+
+        Args:
+            subscribers: The web clients to push the changes to
+            interval: The minimum interval in seconds between two pushes
+        """
+        self._dirty = asyncio.Event()
+        # The stale clients get their snapshots in the next push
+        subscribers.on_stale = self._mark_dirty
+        self._flusher = asyncio.create_task(self._flush_loop(subscribers, interval))
+
+    async def stop_flusher(self) -> None:
+        """Stop the task to push the changes to the clients"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+            self._dirty = None
+
+    async def _flush_loop(self, subscribers: Subscribers, interval: float) -> None:
+        """Push the changes at most once per interval
+
+        The changes coming in a burst are pushed right away (leading edge),
+        then coalesced while waiting, and pushed when the interval elapses
+        (trailing edge), so the latency and the cost are both bounded.
+        """
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            try:
+                self.send_run_data(subscribers)
+                await self.send_legacy_run_data(subscribers)
+            except Exception as exc:  # pragma: no cover
+                logger.error("Failed to push run data: %s", exc)
+            await self._flush_index()
+            await asyncio.sleep(interval)
+
+    def send_run_data(self, subscribers: Subscribers):
+        """Send the changes of the run data since the last sending
+
+        The message is serialized once and queued to all the clients.
+        The clients that were too slow to receive the previous messages
+        get a full snapshot instead.
+        """
+        if not subscribers:
+            return
+
+        stale = [
+            subscriber
+            for subscriber in subscribers
+            if subscriber.stale and not subscriber.legacy
+        ]
+        message = self._dump_patches()
+        if message is not None:
+            # Send data
+            logger.debug(
+                "[bold][yellow]DBG[/yellow][/bold] Sending run data to the frontend"
+            )
+            subscribers.broadcast(message)
+
+        if stale:
+            snapshot = self._dump_snapshot()
+            for subscriber in stale:
+                self._send_snapshot(subscriber, snapshot)
+
+        self._send_log(subscribers)
+
+    async def on_start(self, data):
         # { SECTION_PROCESSES: [p1, p2], SECTION_PROCGROUPS: {pg1: [p3, p4]} }
         if isinstance(data, str):
             data = json.loads(data)
 
         logger.info("WS/PIPELINE Received: Pipeline started")
 
+        # The plugins of the previous versions don't send the workdir
+        if self._index is not None and data.get("workdir"):
+            name = data.get("name") or (
+                self._config_data[SECTION_PIPELINE_OPTIONS]["name"]["value"]
+            )
+            try:
+                self._index_run = await asyncio.to_thread(
+                    self._index.start_run,
+                    name,
+                    _index_workdir(data["workdir"]),
+                )
+            except Exception as exc:  # pragma: no cover
+                logger.error("Failed to write the job index: %s", exc)
+
         if SECTION_DIAGRAM in data:
-            self._run_data[SECTION_DIAGRAM] = data[SECTION_DIAGRAM]
+            self._patch([SECTION_DIAGRAM], data[SECTION_DIAGRAM])
 
         if SECTION_PROCESSES in data:
             for i, proc in enumerate(data[SECTION_PROCESSES]):
-                self._run_data[SECTION_PROCESSES][proc] = {
-                    "order": i,
-                    "status": "init",
-                    "jobs": [],
-                }
+                self._patch(
+                    [SECTION_PROCESSES, proc],
+                    {"order": i, "status": "init", "jobs": JobStatuses()},
+                )
 
         if SECTION_PROCGROUPS in data:
             for pg in data[SECTION_PROCGROUPS]:
-                self._run_data[SECTION_PROCGROUPS][pg] = {}
-                for i, proc in enumerate(data[SECTION_PROCGROUPS][pg]):
-                    self._run_data[SECTION_PROCGROUPS][pg][proc] = {
-                        "order": i,
-                        "status": "init",
-                        "jobs": [],
-                    }
+                self._patch(
+                    [SECTION_PROCGROUPS, pg],
+                    {
+                        proc: {"order": i, "status": "init", "jobs": JobStatuses()}
+                        for i, proc in enumerate(data[SECTION_PROCGROUPS][pg])
+                    },
+                )
 
-        self.timer = time.time()
-        await self.send_run_data(ws, force=True)
+        self._rebuild_summary()
+        self._patch([SECTION_SUMMARY], self._run_data[SECTION_SUMMARY])
 
-    async def on_complete(self, data, ws):
+    async def on_complete(self, data):
         if isinstance(data, str):
             data = json.loads(data)
 
@@ -770,13 +1975,17 @@ class DataManager:
         )
 
         if SECTION_REPORTS in data:
-            self._run_data[SECTION_REPORTS] = data[SECTION_REPORTS]
+            self._patch([SECTION_REPORTS], data[SECTION_REPORTS])
 
         self.running = False
-        self._run_data["FINISHED"] = True
-        await self.send_run_data(ws, force=True)
+        self._patch(["FINISHED"], True)
+
+        if self._index_run is not None:
+            self._index.finish_run(self._index_run, data["succeeded"])
+            self._index_run = None
+            await self._flush_index()
 
-    async def on_proc_start(self, data, ws):
+    async def on_proc_start(self, data):
         if isinstance(data, str):
             data = json.loads(data)
 
@@ -788,16 +1997,20 @@ class DataManager:
             njobs,
         )
 
-        if not group:
-            self._run_data[SECTION_PROCESSES][proc]["status"] = "running"
-            self._run_data[SECTION_PROCESSES][proc]["jobs"] = ["init"] * njobs
-        else:
-            self._run_data[SECTION_PROCGROUPS][group][proc]["status"] = "running"
-            self._run_data[SECTION_PROCGROUPS][group][proc]["jobs"] = ["init"] * njobs
+        procpath = self._proc_path(proc, group)
+        procdata = self._get_proc(proc, group)
+        self._count(group, "procs", procdata["status"], "running")
+        for status, n in procdata["jobs"].counts.items():
+            self._count(group, "jobs", status, None, n)
+        self._count(group, "jobs", None, "init", njobs)
+
+        self._patch([*procpath, "status"], "running")
+        self._patch([*procpath, "jobs"], JobStatuses(njobs))
 
-        await self.send_run_data(ws, force=True)
+        if self._index_run is not None:
+            self._index.proc_start(self._index_run, proc, group, njobs)
 
-    async def on_proc_done(self, data, ws):
+    async def on_proc_done(self, data):
         if isinstance(data, str):
             data = json.loads(data)
 
@@ -813,17 +2026,15 @@ class DataManager:
             succeeded,
         )
 
-        procdata = (
-            self._run_data[SECTION_PROCESSES][proc]
-            if not group
-            else self._run_data[SECTION_PROCGROUPS][group][proc]
-        )
         # succeeded could be True, False, or "cached"
-        procdata["status"] = "succeeded" if succeeded else "failed"
+        status = "succeeded" if succeeded else "failed"
+        self._count(group, "procs", self._get_proc(proc, group)["status"], status)
+        self._patch([*self._proc_path(proc, group), "status"], status)
 
-        await self.send_run_data(ws, force=True)
+        if self._index_run is not None:
+            self._index.proc_done(self._index_run, proc, group, status)
 
-    async def _on_job(self, data, status, ws):
+    async def _on_job(self, data, status):
         if isinstance(data, str):
             data = json.loads(data)
 
@@ -836,39 +2047,54 @@ class DataManager:
             job,
         )
 
-        if not group:
-            self._run_data[SECTION_PROCESSES][proc]["jobs"][job] = status
-        else:
-            self._run_data[SECTION_PROCGROUPS][group][proc]["jobs"][job] = status
-        await self.send_run_data(ws)
+        if self._index_run is not None:
+            self._index.job(self._index_run, proc, group, job, status)
 
-    async def on_job_queued(self, data, ws):
-        await self._on_job(data, "queued", ws)
+        # Cached jobs are shown as succeeded
+        if status == "cached":
+            status = "succeeded"
 
-    async def on_job_submitted(self, data, ws):
-        await self._on_job(data, "submitted", ws)
+        jobs = self._get_proc(proc, group)["jobs"]
+        self._count(group, "jobs", jobs[job], status)
+        self._patch(
+            [*self._proc_path(proc, group), "jobs", job],
+            JOB_STATUS_CODES[status],
+        )
+
+    async def on_job_queued(self, data):
+        await self._on_job(data, "queued")
+
+    async def on_job_submitted(self, data):
+        await self._on_job(data, "submitted")
 
-    async def on_job_running(self, data, ws):
-        await self._on_job(data, "running", ws)
-        # Notify the frontend that the job is running
-        await self.send_run_data(ws, force=True)
+    async def on_job_running(self, data):
+        await self._on_job(data, "running")
 
-    async def on_job_killed(self, data, ws):
-        await self._on_job(data, "killed", ws)
+    async def on_job_killed(self, data):
+        await self._on_job(data, "killed")
 
-    async def on_job_failed(self, data, ws):
-        await self._on_job(data, "failed", ws)
+    async def on_job_failed(self, data):
+        await self._on_job(data, "failed")
 
-    async def on_job_succeeded(self, data, ws):
-        await self._on_job(data, "succeeded", ws)
+    async def on_job_succeeded(self, data):
+        await self._on_job(data, "succeeded")
 
-    async def on_job_cached(self, data, ws):
-        await self._on_job(data, "succeeded", ws)
+    async def on_job_cached(self, data):
+        await self._on_job(data, "cached")
 
-    async def run_pipeline(self, command, port, ws_clients):
-        """Run a command and send the output to the websocket"""
-        self.clear_run_data()
-        self._run_data[SECTION_LOG] = self._run_data[SECTION_LOG] or ""
+    async def run_pipeline(self, command, port, log_file=None):
+        """Run a command and send the output to the websocket
+
+        Args:
+            command: The command to run the pipeline
+            port: The port of the server, passed to the pipeline to connect
+            log_file: The file to spill the older log lines to
+        """
+        self.clear_run_data(log_file=log_file)
+        self.pipeline_seq = 0
+        # The log is streamed by the log channel, an empty string here
+        # indicates that the log is available
+        self._run_data[SECTION_LOG] = ""
 
         p = await asyncio.create_subprocess_shell(
             command,
@@ -886,22 +2112,20 @@ class DataManager:
         self._command = command
 
         while True:
-            line = await p.stdout.readline()
-            if not line:
+            chunk = await p.stdout.read(self.READ_SIZE)
+            if not chunk:
                 break
 
-            self._run_data[SECTION_LOG] += line.decode()
-            # In case it's too long to data between hooks
-            await self.send_run_data(ws_clients.get("web"))
+            self._log.append(chunk)
+            self._mark_dirty()
 
         if await p.wait() != 0:
             # In case the pipeline fails to start
-            self._run_data["FINISHED"] = "error"
+            self._patch(["FINISHED"], "error")
         else:
-            self._run_data["FINISHED"] = True
+            self._patch(["FINISHED"], True)
 
         self.running = False
-        await self.send_run_data(ws_clients.get("web"), force=True)
 
     async def stop_pipeline(self):
         """Stop the pipeline"""
@@ -957,7 +2181,7 @@ class DataManager:
                 pass
 
         self.running = False
-        self._run_data["FINISHED"] = "error"
+        self._patch(["FINISHED"], "error")
         return {"ok": True, "msg": "Pipeline killed"}
 
 
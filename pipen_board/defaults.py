@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import logging
-from typing import Awaitable, Callable, Coroutine
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Coroutine
 
 from rich.logging import RichHandler
 from hypercorn.config import Config as HyperConfig
@@ -47,8 +48,24 @@ logger.addFilter(PluginNameLogFilter())
 logging.getLogger("asyncio").setLevel(logging.WARNING)
 
 
+def json_default(o: Any) -> Any:
+    """Dump the objects that JSON doesn't know, for `json.dumps(default=...)`"""
+    # Objects knowing how to pack themselves, i.e. JobStatuses
+    if hasattr(o, "to_json"):
+        return o.to_json()
+    return DefaultJSONProvider.default(o)
+
+
+def timestamp(value: Any) -> float:
+    """The timestamp of a time from stat, a datetime from some cloud storages"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value or 0
+
+
 class UnsortedJSONProvider(DefaultJSONProvider):
     sort_keys = False
+    default = staticmethod(json_default)
 
 
 # Subclass Quart to allow using logger
@@ -84,8 +101,18 @@ SECTION_ADDITIONAL_OPTIONS = "ADDITIONAL_OPTIONS"
 SECTION_PROCGROUPS = "PROCGROUPS"
 SECTION_PROCESSES = "PROCESSES"
 SECTION_LOG = "LOG"
+SECTION_LOG_START = "LOG_START"
+SECTION_LOG_ID = "LOG_ID"
 SECTION_DIAGRAM = "DIAGRAM"
 SECTION_REPORTS = "REPORTS"
+SECTION_SUMMARY = "SUMMARY"
+SECTION_TEMPLATES = "TEMPLATES"
+
+# The version of the protocol between the server and the frontend, sent by
+# the frontend. The frontends built before it was versioned get the run data
+# in whole, with the job statuses as lists, and the config data without the
+# templates (see option_templates.py)
+PROTOCOL_VERSION = 2
 
 PIPELINE_OPTIONS = {
     "loglevel": {
@@ -209,3 +236,15 @@ JOB_STATUS = {
     "6": "FINISHED",
     "7": "FAILED",
 }
+
+# The statuses of the jobs shown by the board, and their codes used to
+# pack the statuses to send to the frontend
+JOB_STATUS_CODES = {
+    "init": 0,
+    "queued": 1,
+    "submitted": 2,
+    "running": 3,
+    "killed": 4,
+    "succeeded": 5,
+    "failed": 6,
+}
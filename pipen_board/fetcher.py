@@ -0,0 +1,252 @@
+"""Provides the fetcher of the remote files, with a local cache"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from hashlib import sha256
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from pathlib import Path
+from tempfile import gettempdir
+from typing import Any, Dict, List, Mapping, Tuple
+from urllib.parse import urljoin, urlparse
+
+from .version import __version__
+from .defaults import logger
+
+_ConnKey = Tuple[str, str, int]
+
+
+class Fetcher:
+    """Fetch the remote files without blocking the event loop
+
+    The requests run in threads, with timeouts, and the connections are
+    kept alive and reused for the same hosts.
+
+    The files are cached on disk, with their ETag/Last-Modified. A cached
+    file is used without any request within `max_age` seconds since it was
+    validated, otherwise a conditional request is sent to revalidate it.
+    If the remote is unreachable, the cached file is used anyway.
+
+    Args:
+        cache_dir: The directory to cache the files
+        timeout: The timeout in seconds of the connections and the reads
+        max_age: The seconds a cached file is used without revalidation
+        max_redirects: The max number of redirects to follow
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        timeout: float = 10.0,
+        max_age: float = 60.0,
+        max_redirects: int = 5,
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_redirects = max_redirects
+        self._conns: Dict[_ConnKey, List[HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def cache_file(self, url: str) -> Path:
+        """The file where the content of the url is cached"""
+        name = urlparse(url).path.rstrip("/").split("/")[-1] or "index"
+        return self.cache_dir / f"{sha256(url.encode()).hexdigest()}-{name}"
+
+    def _get_conn(self, key: _ConnKey) -> Tuple[HTTPConnection, bool]:
+        """Get an idle connection to the host, or a new one
+
+        Returns:
+            The connection and whether it is reused
+        """
+        with self._lock:
+            conns = self._conns.get(key)
+            if conns:
+                return conns.pop(), True
+
+        scheme, host, port = key
+        conn_class = HTTPSConnection if scheme == "https" else HTTPConnection
+        return conn_class(host, port, timeout=self.timeout), False
+
+    def _put_conn(self, key: _ConnKey, conn: HTTPConnection) -> None:
+        """Keep the connection for the next requests to the host"""
+        with self._lock:
+            self._conns.setdefault(key, []).append(conn)
+
+    def _request(
+        self,
+        url: str,
+        headers: Mapping[str, str],
+    ) -> Tuple[int, Mapping[str, str], bytes]:
+        """Send a GET request, following the redirects
+
+        Returns:
+            The status, the headers (lowercased names) and the body
+        """
+        for _ in range(self.max_redirects + 1):
+            parsed = urlparse(url)
+            if parsed.scheme not in ("http", "https"):
+                raise ValueError(f"Unsupported URL scheme: {url}")
+
+            port = parsed.port or (443 if parsed.scheme == "https" else 80)
+            key = (parsed.scheme, parsed.hostname, port)
+            path = parsed.path or "/"
+            if parsed.query:
+                path = f"{path}?{parsed.query}"
+
+            conn, reused = self._get_conn(key)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+                # The idle connection may have been closed by the server
+                conn, _ = self._get_conn(key)
+                try:
+                    conn.request("GET", path, headers=headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                except (HTTPException, OSError):
+                    conn.close()
+                    raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._put_conn(key, conn)
+
+            resp_headers = {k.lower(): v for k, v in response.getheaders()}
+            if response.status in (301, 302, 303, 307, 308):
+                url = urljoin(url, resp_headers.get("location", ""))
+                continue
+            return response.status, resp_headers, body
+
+        raise OSError(f"Too many redirects: {url}")
+
+    def _fetch_other(self, url: str, cache_file: Path) -> Path:
+        """Fetch the file with other protocols (i.e. ftp), no revalidation"""
+        from urllib.request import urlopen
+
+        with urlopen(url, timeout=self.timeout) as response:
+            content = response.read()
+        self._save(cache_file, content, {})
+        return cache_file
+
+    def _save(
+        self,
+        cache_file: Path,
+        content: bytes | None,
+        headers: Mapping[str, str],
+    ) -> None:
+        """Save the content and the validators of a cached file"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if content is not None:
+            tmpfile = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            tmpfile.write_bytes(content)
+            tmpfile.replace(cache_file)
+
+        meta = {
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "validated": time.time(),
+        }
+        cache_file.with_name(f"{cache_file.name}.meta.json").write_text(
+            json.dumps(meta)
+        )
+
+    def _load_meta(self, cache_file: Path) -> Mapping[str, Any] | None:
+        """Load the validators of a cached file, None if not cached"""
+        if not cache_file.is_file():
+            return None
+        try:
+            return json.loads(
+                cache_file.with_name(f"{cache_file.name}.meta.json").read_text()
+            )
+        except (OSError, ValueError):
+            # Cached by the previous versions, without validators
+            return {}
+
+    def fetch_sync(self, url: str, max_age: float | None = None) -> Path:
+        """Fetch a file to the cache, blocks
+
+        Args:
+            url: The url of the file
+            max_age: Override the max_age of the fetcher, 0 to always
+                revalidate the cached file
+
+        Returns:
+            The path to the cached file
+        """
+        max_age = self.max_age if max_age is None else max_age
+        cache_file = self.cache_file(url)
+        meta = self._load_meta(cache_file)
+        if meta is not None and time.time() - meta.get("validated", 0) < max_age:
+            return cache_file
+
+        headers = {"User-Agent": f"pipen-board/{__version__}"}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            if urlparse(url).scheme not in ("http", "https"):
+                return self._fetch_other(url, cache_file)
+            status, resp_headers, body = self._request(url, headers)
+        except (HTTPException, OSError) as exc:
+            if meta is None:
+                raise OSError(f"Failed to fetch {url}: {exc}") from None
+            logger.warning(
+                "Failed to revalidate %s, using the cached one: %s",
+                url,
+                exc,
+            )
+            return cache_file
+
+        if status == 304 and meta is not None:
+            # The validators may not be sent again with 304
+            self._save(
+                cache_file,
+                None,
+                {
+                    "etag": resp_headers.get("etag", meta.get("etag")),
+                    "last-modified": resp_headers.get(
+                        "last-modified", meta.get("last_modified")
+                    ),
+                },
+            )
+        elif 200 <= status < 300:
+            self._save(cache_file, body, resp_headers)
+        else:
+            raise OSError(f"Failed to fetch {url}: HTTP {status}")
+        return cache_file
+
+    async def fetch(self, url: str, max_age: float | None = None) -> Path:
+        """Fetch a file to the cache, in a thread
+
+        See `fetch_sync` for the arguments.
+        """
+        return await asyncio.to_thread(self.fetch_sync, url, max_age)
+
+    async def fetch_text(self, url: str, max_age: float | None = None) -> str:
+        """Fetch a file and return its content"""
+        path = await self.fetch(url, max_age)
+        return await asyncio.to_thread(path.read_text)
+
+    def close(self) -> None:
+        """Close the idle connections"""
+        with self._lock:
+            conns, self._conns = self._conns, {}
+        for hostconns in conns.values():
+            for conn in hostconns:
+                conn.close()
+
+
+fetcher = Fetcher(Path(gettempdir()) / "pipen-board-fetch-cache")
@@ -6,6 +6,11 @@ const SECTION_RUNNING_OPTS = "RUNNING_OPTIONS";
 const SECTION_DIAGRAM = "DIAGRAM";
 const SECTION_REPORTS = "REPORTS";
 const SECTION_LOG = "LOG";
+const SECTION_LOG_START = "LOG_START";
+const SECTION_LOG_ID = "LOG_ID";
+const SECTION_TEMPLATES = "TEMPLATES";
+// The version of the protocol with the server (see PROTOCOL_VERSION in defaults.py)
+const PROTOCOL_VERSION = 2;
 const PROCESS_ENVS_DESC = "The options that shared by all jobs of the process";
 const PROCESS_PLUGIN_OPTS_DESC = "The plugin options for the process";
 const DEFAULT_DESCRIPTIONS = {
@@ -36,6 +41,18 @@ Running options are used to generate the command line to run the pipeline.
 `
 };
 
+// The statuses of the jobs, indexed by the codes used by the server
+// to pack the statuses (see JOB_STATUS_CODES in defaults.py)
+const JOB_STATUSES = [
+    "init",
+    "queued",
+    "submitted",
+    "running",
+    "killed",
+    "succeeded",
+    "failed",
+];
+
 const JOB_TAG_KIND = {
     "failed": "red",
     "succeeded": "green",
@@ -50,13 +67,18 @@ export {
     SECTION_DIAGRAM,
     SECTION_REPORTS,
     SECTION_LOG,
+    SECTION_LOG_START,
+    SECTION_LOG_ID,
     SECTION_PIPELINE_OPTS,
     SECTION_PROCESSES,
     SECTION_PROCGROUPS,
     SECTION_ADDITIONAL_OPTS,
     SECTION_RUNNING_OPTS,
+    SECTION_TEMPLATES,
+    PROTOCOL_VERSION,
     PROCESS_ENVS_DESC,
     PROCESS_PLUGIN_OPTS_DESC,
     DEFAULT_DESCRIPTIONS,
+    JOB_STATUSES,
     JOB_TAG_KIND,
 };
@@ -1,7 +1,7 @@
 import { marked } from 'marked';
 import { tick } from 'svelte';
 import * as itoml from "@iarna/toml";
-import { SECTION_PIPELINE_OPTS, SECTION_ADDITIONAL_OPTS, SECTION_PROCESSES, SECTION_PROCGROUPS } from './constants';
+import { SECTION_PIPELINE_OPTS, SECTION_ADDITIONAL_OPTS, SECTION_PROCESSES, SECTION_PROCGROUPS, SECTION_TEMPLATES, JOB_STATUSES } from './constants';
 
 
 function moreLikeOption(option) {
@@ -375,13 +375,18 @@ const insertTab = async function(e) {
 const getStatusPercentage = function(data) {
     let counts = {succeeded: 0, failed: 0, running: 0, init: 0};
 
-    for (let proc in data[SECTION_PROCESSES]) {
-        counts[data[SECTION_PROCESSES][proc].status] += 1;
-    }
+    if (data.SUMMARY) {
+        // counted by the server
+        counts = { ...counts, ...data.SUMMARY.pipeline.procs };
+    } else {
+        for (let proc in data[SECTION_PROCESSES]) {
+            counts[data[SECTION_PROCESSES][proc].status] += 1;
+        }
 
-    for (let group in data[SECTION_PROCGROUPS]) {
-        for (let proc in data[SECTION_PROCGROUPS][group]) {
-            counts[data[SECTION_PROCGROUPS][group][proc].status] += 1;
+        for (let group in data[SECTION_PROCGROUPS]) {
+            for (let proc in data[SECTION_PROCGROUPS][group]) {
+                counts[data[SECTION_PROCGROUPS][group][proc].status] += 1;
+            }
         }
     }
     const total = counts.succeeded + counts.failed + counts.running + counts.init;
@@ -396,6 +401,74 @@ const getStatusPercentage = function(data) {
     ];
 };
 
+const decodeJobs = function(jobs) {
+    // decode the packed statuses of the jobs from the server
+    // { n, counts, rle: [code1, count1, ...] } or { n, counts, b64 }
+    if (!jobs || Array.isArray(jobs)) { return jobs || []; }
+    const out = new Array(jobs.n);
+    if (jobs.rle) {
+        let i = 0;
+        for (let k = 0; k < jobs.rle.length; k += 2) {
+            out.fill(JOB_STATUSES[jobs.rle[k]], i, i + jobs.rle[k + 1]);
+            i += jobs.rle[k + 1];
+        }
+    } else {
+        const codes = atob(jobs.b64 || "");
+        for (let i = 0; i < codes.length; i++) {
+            out[i] = JOB_STATUSES[codes.charCodeAt(i)];
+        }
+    }
+    return out;
+};
+
+const _decodeProc = function(procdata) {
+    if (procdata && procdata.jobs !== undefined) {
+        procdata.jobs = decodeJobs(procdata.jobs);
+    }
+    return procdata;
+};
+
+const decodeRunData = function(data) {
+    // decode the packed statuses of the jobs in the run data
+    if (!data) { return data; }
+    for (const proc in data[SECTION_PROCESSES] || {}) {
+        _decodeProc(data[SECTION_PROCESSES][proc]);
+    }
+    for (const group in data[SECTION_PROCGROUPS] || {}) {
+        for (const proc in data[SECTION_PROCGROUPS][group]) {
+            _decodeProc(data[SECTION_PROCGROUPS][group][proc]);
+        }
+    }
+    return data;
+};
+
+const applyRunPatch = function(data, ops) {
+    // apply the patch operations from the server to the run data
+    // op: { op: "set", path: [key, ...], value }
+    for (const { path, value } of ops) {
+        let target = data;
+        for (const key of path.slice(0, -1)) {
+            target = target[key];
+        }
+        const last = path[path.length - 1];
+        const section = path[0];
+        if (path[path.length - 2] === "jobs") {
+            // the code of the status of a single job
+            target[last] = JOB_STATUSES[value];
+        } else if (last === "jobs") {
+            target[last] = decodeJobs(value);
+        } else if (section === SECTION_PROCESSES && path.length === 2) {
+            target[last] = _decodeProc(value);
+        } else if (section === SECTION_PROCGROUPS && path.length === 2) {
+            for (const proc in value) { _decodeProc(value[proc]); }
+            target[last] = value;
+        } else {
+            target[last] = value;
+        }
+    }
+    return data;
+};
+
 
 const fetchAPI = async function(url, options, result = "json") {
     let response;
@@ -418,6 +491,117 @@ const fetchAPI = async function(url, options, result = "json") {
     }
 };
 
+const expandProc = function(procinfo, templates) {
+    // Expand the options referring to the shared templates, {"$ref": key, ...}
+    if (!templates || !procinfo.value) {
+        return procinfo;
+    }
+    const value = {};
+    for (const [key, option] of Object.entries(procinfo.value)) {
+        if (option && option.$ref !== undefined) {
+            const { $ref, ...rest } = option;
+            value[key] = { ...structuredClone(templates[$ref]), ...rest };
+        } else {
+            value[key] = option;
+        }
+    }
+    return { ...procinfo, value };
+};
+
+const expandConfig = function(config) {
+    // Expand the config data compacted with the shared option templates
+    const templates = config[SECTION_TEMPLATES];
+    if (!templates) {
+        return config;
+    }
+    for (const [proc, procinfo] of Object.entries(config[SECTION_PROCESSES] || {})) {
+        config[SECTION_PROCESSES][proc] = expandProc(procinfo, templates);
+    }
+    for (const groupinfo of Object.values(config[SECTION_PROCGROUPS] || {})) {
+        for (const [proc, procinfo] of Object.entries(groupinfo.PROCESSES || {})) {
+            groupinfo.PROCESSES[proc] = expandProc(procinfo, templates);
+        }
+    }
+    return config;
+};
+
+// Where the config data was loaded from, {configfile, preset}, kept with the
+// data (not sent or saved with it), so that its processes are loaded from the
+// same config
+const CONFIG_SOURCE = Symbol("configSource");
+
+// The loadings of the process config data in flight,
+// keyed by the config source and group/proc
+const _procLoadings = {};
+
+const loadProcConfig = async function(data, proc, procgroup) {
+    // Load the config data of a process stubbed in the skeleton
+    // returns true if it was loaded
+    const procs = procgroup
+        ? data[SECTION_PROCGROUPS][procgroup].PROCESSES
+        : data[SECTION_PROCESSES];
+    if (!procs || !procs[proc] || !procs[proc].lazy) {
+        return false;
+    }
+    const source = data[CONFIG_SOURCE] || {};
+    const key = `${JSON.stringify(source)}\n${procgroup || ""}/${proc}`;
+    if (!_procLoadings[key]) {
+        _procLoadings[key] = fetchAPI("/api/pipeline/proc", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ proc, procgroup, ...source }),
+        }).finally(() => {
+            delete _procLoadings[key];
+        });
+    }
+    const loaded = await _procLoadings[key];
+    if (procs[proc].lazy) {
+        procs[proc] = expandProc(loaded, data[SECTION_TEMPLATES]);
+    }
+    return true;
+};
+
+const loadAllProcConfigs = async function(data) {
+    // Load all the process config data stubbed in the skeleton,
+    // needed before the whole config is generated or saved
+    const loadings = Object.keys(data[SECTION_PROCESSES] || {}).map(
+        proc => loadProcConfig(data, proc)
+    );
+    for (const [group, groupinfo] of Object.entries(data[SECTION_PROCGROUPS] || {})) {
+        for (const proc of Object.keys(groupinfo.PROCESSES)) {
+            loadings.push(loadProcConfig(data, proc, group));
+        }
+    }
+    return (await Promise.all(loadings)).some(loaded => loaded);
+};
+
+const _isPlainObject = v => v !== null && typeof v === "object" && !Array.isArray(v);
+
+const diffConfig = function(base, data, path = [], patch = { set: [], del: [] }) {
+    // Get the changes that turn the base config data into the data,
+    // as {set: [[path, value]], del: [path]}, to be saved partially
+    if (_isPlainObject(base) && _isPlainObject(data)) {
+        for (const [key, val] of Object.entries(data)) {
+            if (val === undefined) {
+                continue;
+            }
+            if (base[key] === undefined) {
+                patch.set.push([[...path, key], val]);
+            } else {
+                diffConfig(base[key], val, [...path, key], patch);
+            }
+        }
+        for (const [key, val] of Object.entries(base)) {
+            if (val !== undefined && data[key] === undefined) {
+                patch.del.push([...path, key]);
+            }
+        }
+    } else if (JSON.stringify(base) !== JSON.stringify(data)) {
+        patch.set.push([path, data]);
+    }
+    return patch;
+};
+
 function get_pgvalue(pgargs, pgargkey) {
     // get the value of a process group argument
     if (pgargs === undefined || pgargs === null) { return undefined; }
@@ -449,7 +633,15 @@ export {
     autoHeight,
     insertTab,
     getStatusPercentage,
+    decodeJobs,
+    decodeRunData,
+    applyRunPatch,
     fetchAPI,
+    expandConfig,
+    CONFIG_SOURCE,
+    loadProcConfig,
+    loadAllProcConfigs,
+    diffConfig,
     get_pgvalue,
     IS_DEV,
 };
@@ -0,0 +1,182 @@
+"""Provides the index of the saved configurations (histories)"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import time
+from typing import Any, Dict, List, Mapping
+
+from panpath import PanPath
+from slugify import slugify
+
+from .defaults import logger, timestamp
+
+
+class HistoryIndex:
+    """The index of the saved configurations of a pipeline
+
+    The index is kept in a file in the schema directory, with the name,
+    workdir, ctime, mtime, size and base (see `config_store`) of each saved
+    configuration, so that the histories can be listed without globbing and
+    stating the files, which is slow on cloud storage. The bases of the
+    configurations indexed by scanning are unknown, as the files are not
+    read.
+
+    The index is built by scanning the directory when it doesn't exist (or
+    a refresh is requested), then kept updated by the APIs that save or
+    delete the configurations.
+
+    Args:
+        schema_dir: The directory where the configurations are saved
+        pipeline: The pipeline, as passed to the CLI
+    """
+
+    VERSION = 1
+
+    def __init__(self, schema_dir: str | PanPath, pipeline: str) -> None:
+        self.schema_dir = PanPath(schema_dir)
+        self.prefix = slugify(pipeline)
+        # Hidden, so that it is never taken as a saved configuration
+        self.path = self.schema_dir.joinpath(f".{self.prefix}.history.json")
+        self._entries: Dict[str, Mapping[str, Any]] | None = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def parse_name(configfile: str) -> Mapping[str, str]:
+        """Get the name and the workdir from the name of a saved config file"""
+        parts = configfile[:-5].split(".")
+        return {
+            "name": parts[-2],
+            "workdir": base64.b64decode(parts[-1] + "==").decode(),
+        }
+
+    async def _scan(self) -> Dict[str, Mapping[str, Any]]:
+        """Build the entries by scanning the schema directory"""
+        entries = {}
+        if not await self.schema_dir.a_is_dir():
+            return entries
+
+        async for histfile in self.schema_dir.a_glob(f"{self.prefix}.*.*.json"):
+            try:
+                entry = dict(self.parse_name(histfile.name))
+            except ValueError:  # pragma: no cover
+                continue
+            st = await histfile.a_stat()
+            entry["ctime"] = timestamp(st.st_ctime)
+            entry["mtime"] = timestamp(st.st_mtime)
+            entry["size"] = st.st_size or 0
+            entries[histfile.name] = entry
+        return entries
+
+    async def _save(self) -> None:
+        if not await self.schema_dir.a_is_dir():
+            await self.schema_dir.a_mkdir(parents=True, exist_ok=True)
+        await self.path.a_write_text(
+            json.dumps({"version": self.VERSION, "entries": self._entries})
+        )
+
+    async def _load(self, refresh: bool = False) -> Dict[str, Mapping[str, Any]]:
+        """Load the entries, from memory, the index file, or by scanning"""
+        if self._entries is not None and not refresh:
+            return self._entries
+
+        if not refresh:
+            try:
+                data = json.loads(await self.path.a_read_text())
+            except Exception:
+                data = None
+            if data and data.get("version") == self.VERSION:
+                self._entries = data["entries"]
+                return self._entries
+
+        logger.info(
+            "[bold][yellow]API[/yellow][/bold] Indexing histories in: %s",
+            self.schema_dir,
+        )
+        self._entries = await self._scan()
+        await self._save()
+        return self._entries
+
+    async def query(
+        self,
+        workdir: str | None = None,
+        name: str | None = None,
+        refresh: bool = False,
+    ) -> List[Mapping[str, Any]]:
+        """List the saved configurations, the latest modified first
+
+        Args:
+            workdir: Only the ones with this workdir
+            name: Only the ones whose names contain this, case-insensitive
+            refresh: Rebuild the index by scanning the directory
+
+        Returns:
+            The entries, with `configfile` added
+        """
+        async with self._lock:
+            entries = await self._load(refresh)
+
+        out = [
+            {"configfile": configfile, **entry}
+            for configfile, entry in entries.items()
+            if (workdir is None or entry["workdir"] == workdir)
+            and (not name or name.lower() in entry["name"].lower())
+        ]
+        out.sort(key=lambda entry: entry["mtime"], reverse=True)
+        return out
+
+    async def update(self, configfile: str, size: int, base: str | None) -> None:
+        """Record a saved configuration, just written with `size` bytes,
+        as a patch against the base with the digest"""
+        now = time.time()
+        async with self._lock:
+            entries = await self._load()
+            entry = entries.get(configfile)
+            entries[configfile] = {
+                **self.parse_name(configfile),
+                "ctime": entry["ctime"] if entry else now,
+                "mtime": now,
+                "size": size,
+                "base": base,
+            }
+            await self._save()
+
+    async def remove(self, configfile: str) -> None:
+        """Remove a deleted configuration"""
+        async with self._lock:
+            entries = await self._load()
+            if entries.pop(configfile, None) is not None:
+                await self._save()
+
+
+_history_indexes: Dict[tuple, HistoryIndex] = {}
+
+
+async def known_bases(schema_dir: str | PanPath) -> Dict[str, str | None]:
+    """Get the bases of the saved configurations recorded in all the history
+    indexes in the schema directory, by the names of the files
+
+    The configurations with unknown bases are not included.
+    """
+    out = {}
+    async for path in PanPath(schema_dir).a_glob(".*.history.json"):
+        try:
+            data = json.loads(await path.a_read_text())
+        except Exception:
+            continue
+        if data.get("version") != HistoryIndex.VERSION:
+            continue
+        for configfile, entry in data["entries"].items():
+            if "base" in entry:
+                out[configfile] = entry["base"]
+    return out
+
+
+def get_history_index(schema_dir: str | PanPath, pipeline: str) -> HistoryIndex:
+    """Get the history index of the pipeline, shared by the requests"""
+    key = (str(schema_dir), pipeline)
+    if key not in _history_indexes:
+        _history_indexes[key] = HistoryIndex(schema_dir, pipeline)
+    return _history_indexes[key]
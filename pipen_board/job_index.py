@@ -0,0 +1,248 @@
+"""Provides the persistent index of the job statuses of the runs"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, List, Mapping, Tuple
+
+# Bumped when the schema changes, the index is rebuilt then, as it is only
+# a cache of the runs
+_SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run INTEGER PRIMARY KEY AUTOINCREMENT,
+    pipeline TEXT NOT NULL,
+    workdir TEXT NOT NULL,
+    started REAL NOT NULL,
+    updated REAL NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0,
+    succeeded INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_pipeline ON runs (pipeline, workdir, run);
+CREATE TABLE IF NOT EXISTS procs (
+    run INTEGER NOT NULL,
+    procgroup TEXT NOT NULL,
+    proc TEXT NOT NULL,
+    njobs INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    PRIMARY KEY (run, procgroup, proc)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    run INTEGER NOT NULL,
+    procgroup TEXT NOT NULL,
+    proc TEXT NOT NULL,
+    job INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (run, procgroup, proc, job)
+);
+CREATE TABLE IF NOT EXISTS events (
+    run INTEGER NOT NULL,
+    time REAL NOT NULL,
+    type TEXT NOT NULL,
+    procgroup TEXT,
+    proc TEXT,
+    job INTEGER,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS events_run ON events (run);
+"""
+
+
+class JobIndex:
+    """The index of the events and the job statuses of the runs, in SQLite
+
+    So that the statuses of the previous run can be restored without reading
+    a job.rc file per job, and the cached, killed or never-run jobs can be
+    told apart.
+
+    The writes are queued and committed in batches by `flush()`, which is
+    supposed to run in a thread. Only the latest `KEEP_RUNS` runs of each
+    pipeline in each workdir are kept.
+
+    Args:
+        path: The path to the database file
+    """
+
+    KEEP_RUNS = 5
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # The queued writes, (sql, params)
+        self._pending: List[Tuple[str, tuple]] = []
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != _SCHEMA_VERSION:
+                with self._conn:
+                    for table in ("runs", "procs", "jobs", "events"):
+                        self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+                    self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            self._conn.executescript(_SCHEMA)
+
+    def _queue(self, sql: str, params: tuple) -> None:
+        self._pending.append((sql, params))
+
+    def _event(
+        self,
+        run: int,
+        type: str,
+        group: str | None = None,
+        proc: str | None = None,
+        job: int | None = None,
+        status: str | None = None,
+    ) -> None:
+        self._queue(
+            "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run, time.time(), type, group, proc, job, status),
+        )
+
+    def start_run(self, pipeline: str, workdir: str) -> int:
+        """Record a new run of the pipeline, committed right away
+
+        The runs of the pipeline in the workdir older than the latest
+        `KEEP_RUNS` ones are removed, with their processes, jobs and events.
+
+        Args:
+            pipeline: The name of the pipeline
+            workdir: The working directory of the pipeline
+
+        Returns:
+            The id of the run
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (pipeline, workdir, started, updated) "
+                "VALUES (?, ?, ?, ?)",
+                (pipeline, workdir, now, now),
+            )
+            run = cursor.lastrowid
+            self._conn.execute(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run, now, "on_start", None, None, None, None),
+            )
+            old_runs = [
+                (row[0],)
+                for row in self._conn.execute(
+                    "SELECT run FROM runs WHERE pipeline = ? AND workdir = ? "
+                    "ORDER BY run DESC LIMIT -1 OFFSET ?",
+                    (pipeline, workdir, self.KEEP_RUNS),
+                )
+            ]
+            for table in ("events", "jobs", "procs", "runs"):
+                self._conn.executemany(
+                    f"DELETE FROM {table} WHERE run = ?",
+                    old_runs,
+                )
+        return run
+
+    def finish_run(self, run: int, succeeded: bool) -> None:
+        """Record the completion of a run"""
+        self._event(run, "on_complete", status=str(succeeded))
+        self._queue(
+            "UPDATE runs SET finished = 1, succeeded = ? WHERE run = ?",
+            (int(bool(succeeded)), run),
+        )
+
+    def proc_start(self, run: int, proc: str, group: str | None, njobs: int) -> None:
+        """Record the start of a process"""
+        self._event(run, "on_proc_start", group, proc, status="running")
+        self._queue(
+            "INSERT OR REPLACE INTO procs VALUES (?, ?, ?, ?, ?)",
+            (run, group or "", proc, njobs, "running"),
+        )
+        # The jobs of the previous trial of the process, if any, are stale
+        self._queue(
+            "DELETE FROM jobs WHERE run = ? AND procgroup = ? AND proc = ?",
+            (run, group or "", proc),
+        )
+
+    def proc_done(self, run: int, proc: str, group: str | None, status: str) -> None:
+        """Record the completion of a process"""
+        self._event(run, "on_proc_done", group, proc, status=status)
+        self._queue(
+            "UPDATE procs SET status = ? WHERE run = ? AND procgroup = ? AND proc = ?",
+            (status, run, group or "", proc),
+        )
+
+    def job(
+        self,
+        run: int,
+        proc: str,
+        group: str | None,
+        job: int,
+        status: str,
+    ) -> None:
+        """Record the status of a job, i.e. queued, cached, killed"""
+        self._event(run, "on_job", group, proc, job, status)
+        self._queue(
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)",
+            (run, group or "", proc, job, status),
+        )
+
+    def flush(self) -> None:
+        """Commit the queued writes in one transaction"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        runs = {params[0] for _, params in pending}
+        now = time.time()
+        with self._lock, self._conn:
+            for sql, params in pending:
+                self._conn.execute(sql, params)
+            self._conn.executemany(
+                "UPDATE runs SET updated = ? WHERE run = ?",
+                [(now, run) for run in runs],
+            )
+
+    def latest_run(self, pipeline: str, workdir: str) -> Mapping[str, Any] | None:
+        """Get the latest run of the pipeline in the workdir, None if not indexed
+
+        Returns:
+            A dict with `run`, `updated`, `finished` and `procs`, which maps
+            (procgroup or None, proc) to `{"njobs", "status", "jobs"}`,
+            where `jobs` maps the job index to its status
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run, updated, finished FROM runs "
+                "WHERE pipeline = ? AND workdir = ? ORDER BY run DESC LIMIT 1",
+                (pipeline, workdir),
+            ).fetchone()
+            if row is None:
+                return None
+
+            run, updated, finished = row
+            procs = {
+                (group or None, proc): {"njobs": njobs, "status": status, "jobs": {}}
+                for group, proc, njobs, status in self._conn.execute(
+                    "SELECT procgroup, proc, njobs, status FROM procs WHERE run = ?",
+                    (run,),
+                )
+            }
+            for group, proc, job, status in self._conn.execute(
+                "SELECT procgroup, proc, job, status FROM jobs WHERE run = ?",
+                (run,),
+            ):
+                procinfo = procs.get((group or None, proc))
+                if procinfo is not None:
+                    procinfo["jobs"][job] = status
+
+        return {
+            "run": run,
+            "updated": updated,
+            "finished": bool(finished),
+            "procs": procs,
+        }
+
+    def close(self) -> None:
+        """Commit the queued writes and close the database"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,97 @@
+"""Provides the compact representation of the statuses of the jobs"""
+
+from __future__ import annotations
+
+import base64
+from typing import Any, Iterable, List, Mapping
+
+from .defaults import JOB_STATUS_CODES
+
+_CODE_TO_STATUS = {code: status for status, code in JOB_STATUS_CODES.items()}
+
+
+class JobStatuses:
+    """The statuses of the jobs of a process, one byte per job
+
+    The number of jobs in each status is maintained on the fly, so that the
+    progress can be computed without scanning the jobs.
+
+    Args:
+        size: The number of jobs
+        status: The initial status of the jobs
+    """
+
+    def __init__(self, size: int = 0, status: str = "init") -> None:
+        code = JOB_STATUS_CODES[status]
+        self._codes = bytearray([code]) * size
+        self._counts = [0] * len(JOB_STATUS_CODES)
+        self._counts[code] = size
+
+    @classmethod
+    def from_list(cls, statuses: Iterable[str]) -> JobStatuses:
+        """Create the object from a list of statuses"""
+        statuses = list(statuses)
+        out = cls(len(statuses))
+        for i, status in enumerate(statuses):
+            out[i] = status
+        return out
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, index: int) -> str:
+        return _CODE_TO_STATUS[self._codes[index]]
+
+    def __setitem__(self, index: int, status: str | int) -> None:
+        code = JOB_STATUS_CODES[status] if isinstance(status, str) else status
+        old = self._codes[index]
+        if old == code:
+            return
+        self._codes[index] = code
+        self._counts[old] -= 1
+        self._counts[code] += 1
+
+    def __contains__(self, status: str) -> bool:
+        return self.count(status) > 0
+
+    def count(self, status: str) -> int:
+        """Get the number of jobs in the status"""
+        return self._counts[JOB_STATUS_CODES[status]]
+
+    @property
+    def counts(self) -> Mapping[str, int]:
+        """The number of jobs in each status"""
+        return {
+            status: self._counts[code]
+            for status, code in JOB_STATUS_CODES.items()
+            if self._counts[code]
+        }
+
+    def _rle(self) -> List[int]:
+        """Run-length encode the codes as [code1, count1, code2, count2, ...]"""
+        out = []
+        codes = self._codes
+        i, n = 0, len(codes)
+        while i < n:
+            code = codes[i]
+            j = i + 1
+            while j < n and codes[j] == code:
+                j += 1
+            out.extend((code, j - i))
+            i = j
+        return out
+
+    def to_json(self) -> Mapping[str, Any]:
+        """Pack the statuses to send to the frontend
+
+        Run-length encoded when the jobs are mostly in the same status,
+        otherwise the codes are packed as a base64 string.
+        """
+        out: dict = {"n": len(self._codes), "counts": self.counts}
+        rle = self._rle()
+        # Each RLE pair costs more than a few bytes in JSON
+        if len(rle) * 2 < len(self._codes):
+            out["rle"] = rle
+        else:
+            out["b64"] = base64.b64encode(self._codes).decode()
+        return out
@@ -0,0 +1,235 @@
+"""Provides the pool of the processes to load the pipelines"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import sys
+import threading
+from multiprocessing import get_context
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, List, Mapping
+
+from .defaults import logger, timestamp
+
+if TYPE_CHECKING:
+    from argparse import Namespace
+
+
+def file_signature(path: str | Path) -> List[int] | None:
+    """The mtime (in ns) and size of a file, None if it doesn't exist
+
+    The cloud paths (`panpath.CloudPath`) are stat'ed with requests to the
+    storage, which block, so this is supposed to run in a thread for them.
+    """
+    try:
+        st = os.stat(path) if isinstance(path, (str, Path)) else path.stat()
+    except Exception:
+        return None
+    mtime = getattr(st, "st_mtime_ns", None)
+    if mtime is None:
+        mtime = int(timestamp(st.st_mtime) * 1e9)
+    return [mtime, st.st_size or 0]
+
+
+def _loader_worker(conn) -> None:
+    """The main loop of a worker process
+
+    The heavy modules are imported before the worker is asked to load a
+    pipeline, then each request `(args, name)` is replied with the config
+    data and the files of the modules imported by the pipelines, until a
+    `None` request is received or the pool is gone.
+    """
+    # Warm up, data_manager imports pipen, pipen_annotate, liquid, simpleconf
+    from .data_manager import _load_pipeline
+
+    imported = set(sys.modules)
+    try:
+        conn.send(os.getpid())
+    except OSError:
+        # The pool is closed while warming up
+        return
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+
+        args, name = request
+        data = _load_pipeline(args, name)
+        # Report all the modules imported since the warm up, including the
+        # ones by the previous loads, as they all affect this process
+        data["modules"] = [
+            mod.__file__
+            for modname, mod in list(sys.modules.items())
+            if modname not in imported and getattr(mod, "__file__", None)
+        ]
+        # The pipeline script may not be registered in sys.modules
+        script = args.pipeline.rpartition(":")[0]
+        if script.endswith(".py"):
+            data["modules"].append(str(Path(script).resolve()))
+        try:
+            conn.send(data)
+        except OSError:
+            break
+
+    conn.close()
+
+
+class _Worker:
+    """A worker process in the pool"""
+
+    def __init__(self) -> None:
+        ctx = get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        # Not daemonic, so that the process can fork to parse the processes
+        # of the pipeline in parallel
+        self.process = ctx.Process(target=_loader_worker, args=(child_conn,))
+        self.process.start()
+        child_conn.close()
+        # The number of pipelines loaded by this worker
+        self.loads = 0
+        # The signatures of the modules imported by the loaded pipelines
+        self.modules: Mapping[str, Any] = {}
+
+    def outdated(self) -> bool:
+        """Whether any of the modules imported has changed"""
+        return any(file_signature(path) != sig for path, sig in self.modules.items())
+
+    def load(self, args: Namespace, name: str | None) -> Mapping[str, Any]:
+        """Load a pipeline in the worker, blocks"""
+        try:
+            # Wait for the warm up
+            if self.loads == 0:
+                self.conn.recv()
+            self.conn.send((args, name))
+            data = self.conn.recv()
+        except (EOFError, OSError) as exc:
+            return {
+                "data": {"error": f"The loader process died: {exc!r}"},
+                "modules": [],
+            }
+
+        self.loads += 1
+        self.modules = {path: file_signature(path) for path in data["modules"]}
+        return data
+
+    def close(self) -> None:
+        """Stop the worker"""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():  # pragma: no cover
+            self.process.kill()
+
+
+class LoaderPool:
+    """The pool of the processes to load the pipelines
+
+    Loading a pipeline in a fresh process keeps the environment of the
+    server clean, but the interpreter has to start and import pipen and
+    its friends every time. The workers here are started ahead of time
+    and wait with the modules imported.
+
+    A worker is recycled after `max_loads` loads, or when any module it
+    imported while loading has changed. With the default `max_loads` of 1,
+    each pipeline is loaded in a process that has loaded nothing else.
+
+    Args:
+        size: The number of idle workers to keep warm
+        max_loads: The max number of pipelines loaded by a worker
+    """
+
+    def __init__(self, size: int = 1, max_loads: int = 1) -> None:
+        self.size = size
+        self.max_loads = max_loads
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        # Runs before multiprocessing joins the children at exit
+        atexit.register(self.close)
+
+    def start(self) -> None:
+        """Start the idle workers, without waiting for them to warm up"""
+        self._closed = False
+        self._replenish()
+
+    def _replenish(self) -> None:
+        """Start new workers to keep the pool full"""
+        with self._lock:
+            while not self._closed and len(self._idle) < self.size:
+                self._idle.append(_Worker())
+
+    def _take(self) -> _Worker | None:
+        """Take an idle worker, or start a new one if none is available
+
+        Returns:
+            The worker, None if the pool is closed
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            while self._idle:
+                worker = self._idle.pop(0)
+                if worker.process.is_alive() and not worker.outdated():
+                    return worker
+                worker.close()
+        return _Worker()
+
+    def _give_back(self, worker: _Worker) -> None:
+        """Put a worker back to the pool, or retire it"""
+        with self._lock:
+            if (
+                self._closed
+                or worker.loads >= self.max_loads
+                or len(self._idle) >= self.size
+                or not worker.process.is_alive()
+            ):
+                worker.close()
+            else:
+                self._idle.append(worker)
+
+    def load(self, args: Namespace, name: str | None) -> Mapping[str, Any]:
+        """Load a pipeline in a worker
+
+        This blocks, and is supposed to run in a thread.
+
+        Args:
+            args: The arguments from the CLI
+            name: The name of the instance of the pipeline
+
+        Returns:
+            A dict with the config data as `data` and the files of the
+            modules imported by the pipeline as `modules`
+        """
+        worker = self._take()
+        if worker is None:
+            return {
+                "data": {"error": "The loader pool is closed."},
+                "modules": [],
+            }
+        # Replenish the pool while the worker is loading
+        self._replenish()
+
+        logger.debug(
+            "[bold][yellow]DBG[/yellow][/bold] Loading pipeline in process %s",
+            worker.process.pid,
+        )
+        try:
+            return worker.load(args, name)
+        finally:
+            self._give_back(worker)
+
+    def close(self) -> None:
+        """Stop all the idle workers"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
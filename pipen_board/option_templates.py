@@ -0,0 +1,123 @@
+"""Provides the shared option templates of the processes in the config data
+
+The processes share the same options inherited from the pipeline (forks,
+cache, plugin_opts, etc), which are large and identical in most cases.
+They are kept once in the TEMPLATES section, and each process refers to
+them by key, with only the items that differ:
+
+    {"$ref": "forks", "value": 4}
+
+The config data is compacted before being sent to the frontend or saved to
+the history files, and expanded after being loaded.
+"""
+
+from __future__ import annotations
+
+from copy import deepcopy
+from typing import Any, Mapping
+
+from .defaults import SECTION_PROCESSES, SECTION_PROCGROUPS, SECTION_TEMPLATES
+
+TEMPLATE_REF = "$ref"
+
+
+def compact_proc(
+    argspec: Mapping[str, Any],
+    templates: Mapping[str, Any] | None,
+) -> Mapping[str, Any]:
+    """Replace the options of a process that come from the templates by refs
+
+    Args:
+        argspec: The argspec of the process
+        templates: The option templates
+
+    Returns:
+        The compacted argspec, the given one is not modified
+    """
+    if not templates or not isinstance(argspec.get("value"), dict):
+        return argspec
+
+    value = {}
+    for key, option in argspec["value"].items():
+        template = templates.get(key)
+        if template is None or not isinstance(option, dict):
+            value[key] = option
+            continue
+
+        ref = {TEMPLATE_REF: key}
+        for item, val in option.items():
+            if item not in template or template[item] != val:
+                ref[item] = val
+        value[key] = ref
+
+    return {**argspec, "value": value}
+
+
+def expand_proc(
+    argspec: Mapping[str, Any],
+    templates: Mapping[str, Any] | None,
+) -> Mapping[str, Any]:
+    """Expand the refs to the templates in the options of a process
+
+    Args:
+        argspec: The argspec of the process
+        templates: The option templates
+
+    Returns:
+        The expanded argspec, the given one is not modified
+    """
+    if not templates or not isinstance(argspec.get("value"), dict):
+        return argspec
+
+    value = {}
+    for key, option in argspec["value"].items():
+        if isinstance(option, dict) and TEMPLATE_REF in option:
+            option = {**deepcopy(templates[option[TEMPLATE_REF]]), **option}
+            del option[TEMPLATE_REF]
+        value[key] = option
+
+    return {**argspec, "value": value}
+
+
+def _map_procs(config: Mapping[str, Any], func: Any) -> Mapping[str, Any]:
+    """Apply func(argspec, templates) to the processes of the config data"""
+    templates = config.get(SECTION_TEMPLATES)
+    if not templates:
+        return config
+
+    out = dict(config)
+    if SECTION_PROCESSES in config:
+        out[SECTION_PROCESSES] = {
+            proc: func(argspec, templates)
+            for proc, argspec in config[SECTION_PROCESSES].items()
+        }
+    if SECTION_PROCGROUPS in config:
+        out[SECTION_PROCGROUPS] = {
+            group: {
+                **groupinfo,
+                SECTION_PROCESSES: {
+                    proc: func(argspec, templates)
+                    for proc, argspec in groupinfo.get(SECTION_PROCESSES, {}).items()
+                },
+            }
+            for group, groupinfo in config[SECTION_PROCGROUPS].items()
+        }
+    return out
+
+
+def compact_config(config: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Compact the config data, a no-op if there are no templates"""
+    return _map_procs(config, compact_proc)
+
+
+def expand_config(config: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Expand the config data, a no-op if there are no templates"""
+    return _map_procs(config, expand_proc)
+
+
+def strip_templates(config: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Drop the templates from the expanded config data
+
+    For the frontends that don't know the templates (see PROTOCOL_VERSION)
+    """
+    return {key: val for key, val in config.items() if key != SECTION_TEMPLATES}
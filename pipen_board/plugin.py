@@ -4,7 +4,10 @@ import logging
 import json
 import sys
 import selectors
-from typing import TYPE_CHECKING
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Any, List, Mapping
 
 import websocket
 from panpath import PanPath
@@ -26,6 +29,238 @@ if TYPE_CHECKING:
 
 logger = get_logger(NAME)
 
+# The job events that will be followed by other events of the same job,
+# they can be dropped when the server is too slow to receive the events
+TRANSIENT_JOB_EVENTS = ("on_job_queued", "on_job_submitted", "on_job_running")
+
+
+class EventSender(threading.Thread):
+    """Send the events to the pipen-board server in the background
+
+    The hooks of pipen only put the events in the queue, so that the
+    pipeline is not blocked by the network I/O. The events are sent in
+    batches, one frame every `interval` seconds or every `batch_size`
+    events. The events of the same job are coalesced, so only the latest
+    status of a job is sent.
+
+    The frames are numbered and the recent ones are kept in a replay buffer.
+    If the connection drops, the sender reconnects and asks the server for
+    the last frame it received, then sends the frames after it again.
+
+    Args:
+        url: The url of the websocket of the server
+        interval: The time window in seconds to gather the events
+        batch_size: The max number of events in a frame
+        max_pending: The max number of pending events. When exceeded, the
+            oldest transient job events (queued, submitted, running) are
+            dropped, or the oldest job events if there are none.
+        max_replay: The max number of frames kept to replay
+        max_retries: The max number of attempts to reconnect
+    """
+
+    def __init__(
+        self,
+        url: str,
+        interval: float = 0.05,
+        batch_size: int = 500,
+        max_pending: int = 10000,
+        max_replay: int = 1000,
+        max_retries: int = 8,
+    ) -> None:
+        super().__init__(name="pipen-board-sender", daemon=True)
+        self.url = url
+        self.ws = None
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        # The sequence number of the last frame
+        self._seq = 0
+        # (seq, frame) of the recent frames
+        self._replay = deque(maxlen=max_replay)
+        # key => event, keys of the job events are (proc, procgroup, job)
+        # so that the events of the same job replace each other
+        self._pending: OrderedDict[Any, Mapping[str, Any]] = OrderedDict()
+        # The keys of the transient job events and of all the job events,
+        # oldest first, to find the ones to drop without scanning the queue.
+        # The keys are removed lazily, so they may be stale.
+        self._transient: deque = deque()
+        self._jobs: deque = deque()
+        self._counter = 0
+        self._dropped = 0
+        self._dropped_final = 0
+        self._closing = False
+        self._cond = threading.Condition()
+
+    def put(self, event: Mapping[str, Any]) -> None:
+        """Put an event in the queue, never blocks"""
+        with self._cond:
+            data = event.get("data", {})
+            if event["type"].startswith("on_job_"):
+                key = (data["proc"], data["procgroup"], data["job"])
+                self._jobs.append(key)
+                if event["type"] in TRANSIENT_JOB_EVENTS:
+                    self._transient.append(key)
+            else:
+                self._counter += 1
+                key = self._counter
+
+            # Keep the position of the job so that it is still sent
+            # between the start and the end of the process
+            self._pending[key] = event
+            if len(self._pending) > self.max_pending:
+                self._drop()
+            if len(self._jobs) > 4 * self.max_pending:
+                self._compact()
+            self._cond.notify()
+
+    def _compact(self) -> None:
+        """Remove the stale keys from the deques of the job events"""
+        self._jobs = deque(key for key in self._pending if isinstance(key, tuple))
+        self._transient = deque(
+            key
+            for key in self._jobs
+            if self._pending[key]["type"] in TRANSIENT_JOB_EVENTS
+        )
+
+    def _drop(self) -> None:
+        """Drop the oldest transient job event, or the oldest job event"""
+        while self._transient:
+            key = self._transient.popleft()
+            event = self._pending.get(key)
+            if event is not None and event["type"] in TRANSIENT_JOB_EVENTS:
+                del self._pending[key]
+                self._dropped += 1
+                if self._dropped == 1:
+                    logger.warning(
+                        "pipen-board server is too slow to receive events, "
+                        "dropping transient job events."
+                    )
+                return
+
+        # No transient events, the queue still has to be bounded
+        while self._jobs:
+            key = self._jobs.popleft()
+            if self._pending.pop(key, None) is not None:
+                self._dropped_final += 1
+                if self._dropped_final == 1:
+                    logger.warning(
+                        "pipen-board server is too slow to receive events, "
+                        "dropping the oldest job events, the statuses of "
+                        "the jobs shown may be outdated."
+                    )
+                return
+
+    def _take(self) -> List[Mapping[str, Any]]:
+        """Take a batch of events from the queue"""
+        with self._cond:
+            while not self._pending and not self._closing:
+                self._cond.wait()
+            if not self._closing and len(self._pending) < self.batch_size:
+                # Wait for more events to come in the window
+                self._cond.wait(self.interval)
+
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popitem(last=False)[1])
+            return batch
+
+    def connect(self) -> None:
+        """Connect to the server"""
+        self.ws = websocket.WebSocket()
+        self.ws.connect(self.url, timeout=10)
+        self.ws.send(json.dumps({"type": "connect", "client": "pipeline"}))
+
+    def _reconnect(self) -> bool:
+        """Reconnect to the server and replay the frames it missed
+
+        Only one attempt without waiting when closing, so that the
+        pipeline is not held.
+        """
+        for attempt in range(self.max_retries):
+            if self._closing and attempt > 0:
+                break
+            if not self._closing:
+                time.sleep(min(0.5 * 2**attempt, 10))
+            try:
+                self.connect()
+                self.ws.send(json.dumps({"type": "resume", "client": "pipeline"}))
+                # {"type": "resume", "seq": <last seq received>}
+                acked = json.loads(self.ws.recv())["seq"]
+                if self._replay and self._replay[0][0] > acked + 1:
+                    logger.warning(
+                        "Some events are lost to pipen-board server (%s-%s).",
+                        acked + 1,
+                        self._replay[0][0] - 1,
+                    )
+                for seq, frame in self._replay:
+                    if seq > acked:
+                        self.ws.send(frame)
+            except (OSError, ValueError, KeyError, websocket.WebSocketException):
+                continue
+
+            logger.info("Reconnected to pipen-board at %s", self.url)
+            return True
+
+        logger.warning(
+            "Failed to reconnect to pipen-board at %s, "
+            "events will not be sent anymore.",
+            self.url,
+        )
+        self.ws = None
+        return False
+
+    def _send(self, batch: List[Mapping[str, Any]]) -> None:
+        self._seq += 1
+        frame = json.dumps(
+            {
+                "type": "batch",
+                "client": "pipeline",
+                "seq": self._seq,
+                "events": batch,
+            }
+        )
+        # Keep it before sending, so it is replayed if sending fails
+        self._replay.append((self._seq, frame))
+        if self.ws is None:
+            return
+        try:
+            self.ws.send(frame)
+        except (OSError, websocket.WebSocketException):
+            self._reconnect()
+
+    def run(self) -> None:
+        while True:
+            batch = self._take()
+            if not batch:
+                # Only when closing and all events are sent
+                break
+            self._send(batch)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Send the remaining events, stop the thread and close the connection
+
+        The remaining events are not waited for if the server is gone.
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        if self.ws is not None:
+            self.join(timeout)
+        if self._dropped or self._dropped_final:
+            logger.warning(
+                "Events dropped for pipen-board: %s transient, %s others.",
+                self._dropped,
+                self._dropped_final,
+            )
+
+        ws, self.ws = self.ws, None
+        if ws is not None:
+            try:
+                ws.close()
+            except (OSError, websocket.WebSocketException):  # pragma: no cover
+                pass
+
 
 class PipenBoardPlugin:
     name = NAME
@@ -35,14 +270,12 @@ class PipenBoardPlugin:
 
     def __init__(self):
         self.ws = None
+        self.sender = None
 
     def _send(self, data, log=None):
         if self.ws:
             data["client"] = "pipeline"
-            try:
-                self.ws.send(json.dumps(data))
-            except BrokenPipeError:
-                pass
+            self.sender.put(data)
 
             logdata = str(data)
             if len(logdata) > 100:
@@ -82,14 +315,17 @@ class PipenBoardPlugin:
 
         # Now that we are spawned by pipen-board
         port = int(port[12:])
-        self.ws = websocket.WebSocket()
-        self.ws.connect(f"ws://localhost:{port}/ws")
+        self.sender = EventSender(f"ws://localhost:{port}/ws")
+        self.sender.connect()
+        self.ws = self.sender.ws
         logger.info(f"Connected to pipen-board at ws://localhost:{port}/ws")
-        self._send({"type": "connect", "client": "pipeline"})
+        self.sender.start()
 
     def _disconnect(self):
         if self.ws:
-            self.ws.close()
+            # Don't hold the pipeline for long if the server is slow
+            self.sender.close(timeout=5)
+            self.sender = None
             self.ws = None
 
     @plugin.impl
@@ -101,7 +337,7 @@ class PipenBoardPlugin:
         if not self.ws:
             return
 
-        data = {}
+        data = {"name": pipen.name, "workdir": str(pipen.workdir)}
         diagram = PanPath(pipen.outdir).joinpath("diagram.svg")
         if await diagram.a_is_file():
             data[SECTION_DIAGRAM] = await diagram.a_read_text()
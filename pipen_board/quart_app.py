@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import os
+import gzip
 import json
+from hashlib import sha256
 from pathlib import Path
+from tempfile import gettempdir
 from typing import TYPE_CHECKING
 
-from panpath import PanPath
+from panpath import PanPath, CloudPath
+from slugify import slugify
 from quart import (
     Request,
+    Response,
     websocket,
     request,
     # copy_current_websocket_context,
@@ -16,11 +21,59 @@ from quart import (
 from .defaults import Quart, logger
 from .apis import GETS, POSTS, WS
 from .data_manager import data_manager
+from .fetcher import fetcher
+from .subscribers import Subscribers
 
 if TYPE_CHECKING:
     from argparse import Namespace
 
 
+# Only the responses larger than this in bytes are compressed
+COMPRESS_MIN_SIZE = 1024
+
+
+async def _etag_and_compress(r: Response) -> Response:
+    """Tag the JSON responses by their content, and compress the large ones
+
+    The responses to GET (and HEAD) unchanged since the client got them are
+    answered with 304, so that the large ones are not sent again. The other
+    methods are only compressed, as 304 is only allowed for GET and HEAD.
+    """
+    if (
+        r.status_code != 200
+        or r.mimetype != "application/json"
+        or "Content-Disposition" in r.headers
+        or "Content-Encoding" in r.headers
+    ):
+        return r
+
+    body = await r.get_data()
+    gzipped = len(body) >= COMPRESS_MIN_SIZE and "gzip" in request.headers.get(
+        "Accept-Encoding", ""
+    )
+    r.headers["Vary"] = "Accept-Encoding"
+
+    if request.method in ("GET", "HEAD"):
+        etag = sha256(body).hexdigest()[:32]
+        # Strong ETags differ for different encodings of the same content
+        if gzipped:
+            etag = f"{etag}-gzip"
+
+        r.set_etag(etag)
+        if "Cache-Control" not in r.headers:
+            # Cached, but always revalidated
+            r.headers["Cache-Control"] = "no-cache"
+        if etag in request.if_none_match:
+            r.status_code = 304
+            r.set_data(b"")
+            return r
+
+    if gzipped:
+        r.set_data(gzip.compress(body, compresslevel=6))
+        r.headers["Content-Encoding"] = "gzip"
+    return r
+
+
 def get_app(args: Namespace):
     """Get the Quart app."""
 
@@ -44,7 +97,7 @@ def get_app(args: Namespace):
             r.headers["Pragma"] = "no-cache"
             r.headers["Expires"] = "0"
             r.headers["Cache-Control"] = "public, max-age=0"
-        return r
+        return await _etag_and_compress(r)
 
     for route, handler in GETS.items():
         app.route(route, methods=["GET"])(handler)
@@ -52,24 +105,58 @@ def get_app(args: Namespace):
     for route, handler in POSTS.items():
         app.route(route, methods=["POST"])(handler)
 
-    clients = {}
+    # "web": the viewers of the run, "pipeline": the running pipeline,
+    # "watch": the pages notified when the pipeline changes in dev mode
+    clients = {"web": Subscribers(), "watch": Subscribers()}
+
+    if isinstance(args.schema_dir, CloudPath):
+        # The log and the index are written frequently, keep them local
+        log_file = Path(gettempdir()).joinpath(
+            f"pipen-board.{slugify(args.pipeline)}.run.log"
+        )
+        index_file = Path(gettempdir()).joinpath(
+            f"pipen-board.{slugify(args.pipeline)}.jobs.db"
+        )
+    else:
+        log_file = Path(args.schema_dir).joinpath(
+            f"{slugify(args.pipeline)}.run.log"
+        )
+        index_file = Path(args.schema_dir).joinpath(
+            f"{slugify(args.pipeline)}.jobs.db"
+        )
+
+    @app.before_serving
+    async def _():
+        data_manager.open_index(index_file)
+        data_manager.start_flusher(clients["web"], args.push_interval)
+        data_manager.start_watcher(args, clients["watch"])
+        data_manager.start_loader(args)
+
+    @app.after_serving
+    async def _():
+        await data_manager.stop_flusher()
+        await data_manager.stop_loader()
+        await data_manager.stop_watcher()
+        await data_manager.close_index()
+        fetcher.close()
 
     @app.websocket("/ws")
     async def ws():
         """The websocket handler"""
         client = None
+        conn = websocket._get_current_object()
         try:
             while True:
                 message = await websocket.receive()
                 message = json.loads(message)
                 client = message["client"]
                 if message["type"] == "connect":
-                    clients[client] = websocket._get_current_object()
-                    await WS[f"{client}/conn"](clients)
+                    await WS[f"{client}/conn"](message, clients, conn)
                 else:
-                    await WS[client](message, clients)
+                    await WS[client](message, clients, conn)
         finally:
-            await WS[f"{client}/disconn"](clients)
+            if client:
+                await WS[f"{client}/disconn"](clients, conn)
 
     @app.route("/api/run", methods=["POST"])
     async def run():
@@ -113,7 +200,7 @@ def get_app(args: Namespace):
             data_manager.run_pipeline,
             command,
             args.port,
-            clients,
+            log_file,
         )
         return {"ok": True, "msg": ""}
 
@@ -135,7 +222,7 @@ def get_app(args: Namespace):
             data_manager.run_pipeline,
             data_manager._command,
             args.port,
-            clients,
+            log_file,
         )
         return {"ok": True}
 
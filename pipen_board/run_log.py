@@ -0,0 +1,274 @@
+"""Provides the log store of the running pipeline"""
+
+from __future__ import annotations
+
+from collections import deque
+from pathlib import Path
+from tempfile import gettempdir
+from typing import TYPE_CHECKING, Deque
+
+if TYPE_CHECKING:
+    from panpath import PanPath
+
+
+def strip_partial_char(data: bytes) -> bytes:
+    """Strip the incomplete UTF-8 sequence at the end of the data, if any
+
+    The output of the pipeline is read in chunks, which may end in the
+    middle of a multi-byte character. The stripped bytes are supposed to be
+    sent with the rest of the character later, instead of being decoded
+    as replacement characters.
+    """
+    # A sequence has at most 4 bytes, look for the start of the last one
+    for i in range(1, min(4, len(data)) + 1):
+        byte = data[-i]
+        if byte & 0xC0 == 0x80:
+            # A continuation byte
+            continue
+        if byte >= 0xF0:
+            expected = 4
+        elif byte >= 0xE0:
+            expected = 3
+        elif byte >= 0xC0:
+            expected = 2
+        else:
+            expected = 1
+        return data[:-i] if i < expected else data
+    return data
+
+
+def lstrip_partial_char(data: bytes) -> bytes:
+    """Strip the rest of a UTF-8 sequence at the start of the data, if any
+
+    For the ranges starting in the middle of a character.
+    """
+    i = 0
+    while i < min(3, len(data)) and data[i] & 0xC0 == 0x80:
+        i += 1
+    return data[i:]
+
+
+class RunLog:
+    """The log of the running pipeline, addressed by byte offsets
+
+    The frontend keeps track of the offset it has received, so that only
+    the new content is sent, and earlier ranges can be fetched on demand.
+
+    Only the recent lines are kept in memory in a bounded buffer, the older
+    lines are spilled to an append-only file, so that the memory stays flat
+    no matter how long the pipeline runs.
+
+    Args:
+        spill_file: The file to spill the older lines to
+        max_buffer_size: The max size in bytes of the lines kept in memory
+    """
+
+    # Size of the blocks to read from the spill file
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        spill_file: str | Path | None = None,
+        max_buffer_size: int = 1024 * 1024,
+    ) -> None:
+        self.max_buffer_size = max_buffer_size
+        self._spill_file = None
+        self._spill = None
+        # The recent complete lines
+        self._lines: Deque[bytes] = deque()
+        # The incomplete last line
+        self._partial = b""
+        # The offset of the first line in the buffer,
+        # also the size of the spill file
+        self._buffer_start = 0
+        self._buffer_size = 0
+        # Increased every time the log is cleared, so that the offsets
+        # of the previous log can be told invalid
+        self.epoch = 0
+        self.clear(spill_file)
+
+    @property
+    def size(self) -> int:
+        """The total size of the log in bytes"""
+        return self._buffer_start + self._buffer_size + len(self._partial)
+
+    def clear(self, spill_file: str | Path | None = None) -> None:
+        """Clear the log
+
+        Args:
+            spill_file: A new file to spill the older lines to,
+                if not given, the current one is truncated and reused.
+        """
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+        if spill_file is not None:
+            self._spill_file = Path(spill_file)
+        elif self._spill_file is None:
+            self._spill_file = Path(gettempdir()) / f"pipen-board.{id(self)}.log"
+
+        if self._spill_file.exists():
+            self._spill_file.unlink()
+
+        self._lines.clear()
+        self._partial = b""
+        self._buffer_start = 0
+        self._buffer_size = 0
+        self.epoch += 1
+
+    def append(self, text: str | bytes) -> None:
+        """Append text to the log"""
+        if isinstance(text, str):
+            text = text.encode()
+        if not text:
+            return
+
+        lines = (self._partial + text).splitlines(keepends=True)
+        if lines[-1].endswith((b"\n", b"\r")):
+            self._partial = b""
+        else:
+            self._partial = lines.pop()
+
+        for line in lines:
+            self._lines.append(line)
+            self._buffer_size += len(line)
+
+        spilled = []
+        while len(self._lines) > 1 and self._buffer_size > self.max_buffer_size:
+            line = self._lines.popleft()
+            self._buffer_size -= len(line)
+            spilled.append(line)
+
+        if spilled:
+            if self._spill is None:
+                self._spill_file.parent.mkdir(parents=True, exist_ok=True)
+                self._spill = self._spill_file.open("ab")
+            content = b"".join(spilled)
+            self._spill.write(content)
+            self._spill.flush()
+            self._buffer_start += len(content)
+
+    def _read_spilled(self, offset: int, end: int) -> bytes:
+        """Read a range from the spill file"""
+        with self._spill_file.open("rb") as fh:
+            fh.seek(offset)
+            return fh.read(end - offset)
+
+    def read(self, offset: int = 0, size: int | None = None) -> bytes:
+        """Read a range of the log
+
+        Args:
+            offset: The start offset in bytes
+            size: The number of bytes to read, None to read to the end
+
+        Returns:
+            The bytes in the range
+        """
+        total = self.size
+        offset = max(0, offset)
+        end = total if size is None else min(total, offset + size)
+        if offset >= end:
+            return b""
+
+        out = []
+        if offset < self._buffer_start:
+            out.append(self._read_spilled(offset, min(end, self._buffer_start)))
+
+        if end > self._buffer_start:
+            # Skip the lines before the offset
+            pos = self._buffer_start
+            for line in self._lines:
+                line_end = pos + len(line)
+                if line_end > offset:
+                    out.append(line[max(0, offset - pos):end - pos])
+                pos = line_end
+                if pos >= end:
+                    break
+            else:
+                out.append(self._partial[max(0, offset - pos):end - pos])
+
+        return b"".join(out)
+
+    def line_start(self, offset: int) -> int:
+        """Get the offset of the first line starting at or after the offset
+
+        This is used to avoid splitting lines (and multi-byte characters)
+        when a range of the log is requested from an arbitrary offset.
+        """
+        total = self.size
+        if offset <= 0:
+            return 0
+        if offset >= total:
+            return total
+
+        pos = offset - 1
+        while pos < total:
+            block = self.read(pos, self.BLOCK_SIZE)
+            idx = block.find(b"\n")
+            if idx >= 0:
+                return pos + idx + 1
+            pos += len(block)
+        return total
+
+
+class LogFile:
+    """The log of a previous run on disk, read by ranges with seeks
+
+    The same interface as `RunLog`, but async, so that the log of a long
+    run is never loaded fully into memory, and the earlier content is
+    paged backwards from the end by the frontend.
+
+    Args:
+        path: The path to the log file
+    """
+
+    BLOCK_SIZE = RunLog.BLOCK_SIZE
+
+    def __init__(self, path: PanPath) -> None:
+        self.path = path
+
+    async def get_size(self) -> int:
+        """The size of the log in bytes"""
+        return (await self.path.a_stat()).st_size
+
+    async def read(self, offset: int = 0, size: int | None = None) -> bytes:
+        """Read a range of the log
+
+        Args:
+            offset: The start offset in bytes
+            size: The number of bytes to read, None to read to the end
+
+        Returns:
+            The bytes in the range
+        """
+        offset = max(0, offset)
+        if size is not None and size <= 0:
+            return b""
+
+        async with self.path.a_open("rb") as fh:
+            # Cloud files only seek forward, which is fine with a new handle
+            await fh.seek(offset)
+            return await fh.read(-1 if size is None else size)
+
+    async def line_start(self, offset: int) -> int:
+        """Get the offset of the first line starting at or after the offset
+
+        See `RunLog.line_start`
+        """
+        total = await self.get_size()
+        if offset <= 0:
+            return 0
+        if offset >= total:
+            return total
+
+        pos = offset - 1
+        while pos < total:
+            block = await self.read(pos, self.BLOCK_SIZE)
+            if not block:
+                break
+            idx = block.find(b"\n")
+            if idx >= 0:
+                return pos + idx + 1
+            pos += len(block)
+        return total
@@ -0,0 +1,127 @@
+"""Provides the registry of the web clients watching the run"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Dict, Iterator
+
+from .defaults import logger
+
+
+class Subscriber:
+    """A web client watching the run
+
+    Each subscriber has its own send queue, drained by its own task, so that
+    a slow client does not delay the others, or the handling of the events
+    from the pipeline.
+
+    When the queue is full, the queued messages are dropped and the
+    subscriber is marked as stale, so that it gets a full snapshot next time.
+
+    Args:
+        ws: The websocket connection
+        maxsize: The max number of messages queued
+        on_stale: Called when the subscriber becomes stale, so that the
+            snapshot is sent even if nothing else changes
+        legacy: Whether the client speaks the protocol before it was
+            versioned, which gets the whole run data in every message,
+            instead of the snapshot, the patches and the log
+    """
+
+    def __init__(
+        self,
+        ws: Any,
+        maxsize: int = 100,
+        on_stale: Callable[[], None] | None = None,
+        legacy: bool = False,
+    ) -> None:
+        self.ws = ws
+        self.legacy = legacy
+        self.stale = False
+        self.on_stale = on_stale
+        # The offset of the run log sent to the client
+        self.log_offset = 0
+        # The epoch of the run log, the offset is invalid if it changes
+        self.log_epoch = 0
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize)
+        self._task = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                await self.ws.send(message)
+            except (BrokenPipeError, ConnectionError):
+                pass
+            except Exception as exc:
+                # Keep draining, or the messages queued are never sent
+                logger.warning("WS/WEB Failed to send a message: %s", exc)
+
+    def offer(self, message: str) -> bool:
+        """Queue a message to send, never blocks
+
+        Returns:
+            False if the queue is full and the subscriber becomes stale
+        """
+        if self.stale:
+            return False
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning(
+                "WS/WEB Client is too slow, will send it a snapshot later."
+            )
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self.stale = True
+            if self.on_stale is not None:
+                self.on_stale()
+            return False
+        return True
+
+    def close(self) -> None:
+        """Stop sending messages to the client"""
+        self._task.cancel()
+
+
+class Subscribers:
+    """The registry of the web clients watching the run"""
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[int, Subscriber] = {}
+        # Passed to the subscribers, called when one becomes stale
+        self.on_stale: Callable[[], None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def __iter__(self) -> Iterator[Subscriber]:
+        return iter(list(self._subscribers.values()))
+
+    def add(self, ws: Any, legacy: bool = False) -> Subscriber:
+        """Register a web client, see `Subscriber` for `legacy`"""
+        subscriber = self._subscribers[id(ws)] = Subscriber(
+            ws,
+            on_stale=self.on_stale,
+            legacy=legacy,
+        )
+        return subscriber
+
+    def get(self, ws: Any) -> Subscriber | None:
+        """Get the subscriber of a web client"""
+        return self._subscribers.get(id(ws))
+
+    def remove(self, ws: Any) -> None:
+        """Unregister a web client"""
+        subscriber = self._subscribers.pop(id(ws), None)
+        if subscriber is not None:
+            subscriber.close()
+
+    def broadcast(self, message: str, exclude: Subscriber | None = None) -> None:
+        """Send a message, serialized once, to all the up-to-date clients
+
+        The legacy clients are skipped, see `Subscriber`.
+        """
+        for subscriber in self:
+            if subscriber is not exclude and not subscriber.legacy:
+                subscriber.offer(message)
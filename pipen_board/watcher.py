@@ -0,0 +1,75 @@
+"""Provides the watcher of the source files of the pipeline"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+from .defaults import logger
+from .loader_pool import file_signature
+
+
+class FileWatcher:
+    """Watch the files for changes, by polling their mtime and size
+
+    Polling keeps it free of extra dependencies and works on all platforms.
+    The stats run in a thread, so a large number of files doesn't block the
+    event loop.
+
+    Args:
+        callback: The coroutine function called with the changed files
+        interval: The interval in seconds between two polls
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[List[str]], Awaitable[Any]],
+        interval: float = 1.0,
+    ) -> None:
+        self.callback = callback
+        self.interval = interval
+        self._files: Dict[str, Any] = {}
+        self._task: asyncio.Task | None = None
+
+    def watch(self, files: Iterable[str]) -> None:
+        """Start watching the files, from their current state"""
+        for path in files:
+            if path and path not in self._files:
+                self._files[path] = file_signature(path)
+
+    def start(self) -> None:
+        """Start polling"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        """Stop polling"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _poll(self) -> List[str]:
+        """Get the changed files and update their states"""
+        changed = []
+        for path, sig in list(self._files.items()):
+            new_sig = file_signature(path)
+            if new_sig != sig:
+                self._files[path] = new_sig
+                changed.append(path)
+        return changed
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            changed = await asyncio.to_thread(self._poll)
+            if not changed:
+                continue
+
+            logger.info(
+                "[bold][yellow]DEV[/yellow][/bold] Changes detected in: %s",
+                ", ".join(changed[:5]) + (" ..." if len(changed) > 5 else ""),
+            )
+            try:
+                await self.callback(changed)
+            except Exception as exc:  # pragma: no cover
+                logger.error("Failed to handle the changes of the files: %s", exc)